@@ -1,11 +1,95 @@
-import requests
+import http_client
 import json
 import re
-import time
-import random
+import resilience
+import archive
+import instagram_stream
+import metrics
+from lazy_import import LazyModule
+from profile_record import ProfileRecord
+
+# Only needed by --download_pic
+avatar_store = LazyModule('avatar_store')
+
+class ExtractionPlan:
+    """A declarative (output field, source path, type) mapping compiled into getters once"""
+
+    def __init__(self, mapping):
+        self.steps = [(field, self._compile_path(path), kind) for field, path, kind in mapping]
+
+    @staticmethod
+    def _compile_path(path):
+        # Build a getter that walks the path, returning _MISSING when any key is absent
+        if len(path) == 1:
+            key = path[0]
+            return lambda source: source.get(key, _MISSING)
+
+        def getter(source):
+            for key in path:
+                if not isinstance(source, dict) or key not in source:
+                    return _MISSING
+                source = source[key]
+            return source
+        return getter
+
+    def apply(self, source):
+        """Return {field: native value} for every field present in source"""
+        values = {}
+        for field, getter, kind in self.steps:
+            value = getter(source)
+            if value is _MISSING:
+                continue
+            if kind is str:
+                # Empty strings keep the "Not Available" default
+                if value:
+                    values[field] = value
+            elif kind is int:
+                values[field] = int(value)
+            else:
+                values[field] = value
+        return values
+
+_MISSING = object()
+
+# ProfileRecord field <- source path under the user object, with its native type
+PROFILE_PLAN = ExtractionPlan([
+    ('full_name', ('full_name',), str),
+    ('biography', ('biography',), str),
+    ('is_verified', ('is_verified',), bool),
+    ('is_private', ('is_private',), bool),
+    ('profile_pic_url', ('profile_pic_url_hd',), str),
+    ('followers', ('edge_followed_by', 'count'), int),
+    ('following', ('edge_follow', 'count'), int),
+    ('posts', ('edge_owner_to_timeline_media', 'count'), int),
+    ('category', ('category_name',), str),
+    ('is_professional', ('is_business_account',), bool)
+])
+
+def average_post_counts(edges):
+    """Return integer (average likes, average comments) over post edges, None when absent"""
+    like_total = like_count = comment_total = comment_count = 0
+    for post in edges:
+        node = post.get('node')
+        if not node:
+            continue
+        liked_by = node.get('edge_liked_by')
+        if liked_by and 'count' in liked_by:
+            like_total += liked_by['count']
+            like_count += 1
+        comments = node.get('edge_media_to_comment')
+        if comments and 'count' in comments:
+            comment_total += comments['count']
+            comment_count += 1
+    avg_likes = int(like_total / like_count) if like_count else None
+    avg_comments = int(comment_total / comment_count) if comment_count else None
+    return avg_likes, avg_comments
 
 class InstagramScraper:
-    def __init__(self):
+    def __init__(self, streaming=True, verbose=True):
+        # Progress/status messages are printed only when verbose
+        self.verbose = verbose
+        # Parse API responses incrementally (needs ijson) instead of decoding them in full
+        self.streaming = streaming
         # Use a more browser-like user agent
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -28,343 +112,284 @@ class InstagramScraper:
         # Backup URL if API fails
         self.backup_url = "https://www.instagram.com/{}/"
 
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+    
     def scrape_profile(self, username):
         """Scrape Instagram profile information using Instagram's API"""
-        print(f"Scraping profile for: {username}")
-        
-        # Initialize profile data with default values
-        profile_data = {
-            "average_comments": "Not Available",
-            "average_likes": "Not Available",
-            "biography": "Not Available",
-            "category": "Not Available",
-            "country": "ID",  # Default to Indonesia as per example
-            "engagement_rate": 0,
-            "followers": "0",
-            "following": "0",
-            "full_name": "Not Available",
-            "is_professional_account": "Not Available",
-            "is_verified": "false",
-            "platform": "instagram",
-            "posts": "0",
-            "profile_pic_url_hd": "",
-            "instagram_url": f"https://www.instagram.com/{username}/",  # Changed key name to avoid duplication
-            "username": username
-        }
+        return self.scrape_record(username).to_instagram_profile()
+    
+    def scrape_record(self, username, strict=False):
+        """Scrape an Instagram profile into a typed ProfileRecord.
+
+        When nothing can be fetched a record of defaults is returned. With strict,
+        unknown accounts return None and every other failure raises its classified
+        resilience.UpstreamError (rate limited, private, parse failure, ...).
+        """
+        self._log(f"Scraping profile for: {username}")
         
         # Try to get data from Instagram API
-        api_data = self._fetch_from_api(username)
+        # With streaming enabled the API response is decoded while it downloads, inside 'fetch'
+        error = None
+        try:
+            with metrics.stage('instagram', 'fetch'):
+                api_data = self._fetch_from_api(username)
+        except resilience.UpstreamError as e:
+            self._log(f"Error fetching from API: {e}")
+            api_data, error = None, e
         if api_data and 'data' in api_data and 'user' in api_data['data']:
-            print("Successfully fetched data from Instagram API")
-            return self._parse_api_data(api_data, profile_data)
+            self._log("Successfully fetched data from Instagram API")
+            with metrics.stage('instagram', 'parse'):
+                record = self._record_from_user(api_data['data']['user'], username, "API")
+            return self._checked(record, strict)
         
-        # If API fails, try to scrape from Instagram website
-        print("API fetch failed, trying to scrape from Instagram website...")
-        web_data = self._fetch_from_web(username)
-        if web_data:
-            return self._parse_web_data(web_data, profile_data)
+        # If API fails, try to scrape from Instagram website; an unknown account is unknown there too
+        if not isinstance(error, resilience.NotFound):
+            self._log("API fetch failed, trying to scrape from Instagram website...")
+            try:
+                with metrics.stage('instagram', 'fetch'):
+                    web_data = self._fetch_from_web(username)
+            except resilience.UpstreamError as e:
+                self._log(f"Error fetching from web: {e}")
+                web_data, error = None, e
+            if web_data:
+                with metrics.stage('instagram', 'parse'):
+                    user = self._find_web_user(web_data)
+                    record = self._record_from_user(user, username, "web") if user else None
+                if record:
+                    return self._checked(record, strict)
+                self._log("Could not find user data in web response")
         
         # If all methods fail, return the default profile data
-        print("All scraping methods failed. Returning default data.")
-        return profile_data
+        self._log("All scraping methods failed. Returning default data.")
+        if strict:
+            if isinstance(error, resilience.NotFound):
+                return None
+            raise error or resilience.ParseFailure(f"No profile data found for {username}", "www.instagram.com")
+        return ProfileRecord('instagram', username=username)
+    
+    def _checked(self, record, strict):
+        """With strict, raise instead of returning a record without counts"""
+        if strict and record.followers is None:
+            if record.is_private:
+                raise resilience.PrivateAccount(f"{record.username} is private", "www.instagram.com")
+            raise resilience.ParseFailure(f"No profile counts found for {record.username}", "www.instagram.com")
+        return record
+    
+    def _default_profile_data(self, username):
+        """Profile data with default values, filled in by the parsers"""
+        return ProfileRecord('instagram', username=username).to_instagram_profile()
     
     def _fetch_from_api(self, username):
         """Fetch profile data from Instagram's API"""
         url = self.api_url.format(username)
-        print(f"Fetching from API: {url}")
+        self._log(f"Fetching from API: {url}")
         
         try:
-            # Add a random delay to avoid rate limiting
-            time.sleep(random.uniform(1.5, 3.0))
+            api_headers = self._api_headers()
             
-            # Add Instagram-specific headers
-            api_headers = self.headers.copy()
-            api_headers['x-ig-app-id'] = '936619743392459'  # Instagram web app ID
-            
-            response = requests.get(url, headers=api_headers)
-            response.raise_for_status()
-            
-            # Save the API response for debugging
-            with open(f"{username}_api_response.json", "w", encoding="utf-8") as f:
-                json.dump(response.json(), f, indent=2, ensure_ascii=False)
-            
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching from API: {e}")
-            return None
-        except json.JSONDecodeError as e:
-            print(f"Error decoding API response: {e}")
-            return None
+            # The archive needs the full body, so only stream when it is off
+            stream = self.streaming and instagram_stream.streaming_available() and archive.get_archive() is None
+            response = self._rate_limited_get(url, headers=api_headers, stream=stream)
+            with response:
+                resilience.raise_for_status(response.status_code, response.headers, url)
+                
+                if stream:
+                    # Read the body incrementally and keep only the fields we parse
+                    response.raw.decode_content = True
+                    return instagram_stream.parse_profile_stream(response.raw)
+                
+                # Keep the raw response only when the archive is enabled
+                archive.record_response('instagram', 'api', username, url, response.content, response.status_code)
+                
+                # Decoded with json rather than response.json(), whose JSONDecodeError is also a RequestException
+                return json.loads(response.content)
+        except http_client.RequestException as e:
+            raise resilience.UpstreamError(f"Error fetching from API: {e}", "i.instagram.com") from e
+        except ValueError as e:
+            raise resilience.ParseFailure(f"Error decoding API response: {e}", "i.instagram.com") from e
+    
+    def _api_headers(self):
+        """Browser headers plus the Instagram-specific ones the API endpoint expects"""
+        api_headers = self.headers.copy()
+        api_headers['x-ig-app-id'] = '936619743392459'  # Instagram web app ID
+        return api_headers
+    
+    def _rate_limited_get(self, url, **kwargs):
+        """GET a URL, taking a token from the host's shared rate limiter before every attempt"""
+        return http_client.get(url, rate_limited=True, **kwargs)
     
     def _fetch_from_web(self, username):
         """Fetch profile data from Instagram website"""
         url = self.backup_url.format(username)
-        print(f"Fetching from web: {url}")
+        self._log(f"Fetching from web: {url}")
         
         try:
-            # Add a random delay to avoid rate limiting
-            time.sleep(random.uniform(2.0, 4.0))
-            
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            response = self._rate_limited_get(url, headers=self.headers)
+            resilience.raise_for_status(response.status_code, response.headers, url)
             
-            # Save the HTML response for debugging
-            with open(f"{username}_web_response.html", "w", encoding="utf-8") as f:
-                f.write(response.text)
+            # Keep the raw response only when the archive is enabled
+            archive.record_response('instagram', 'web', username, url, response.content, response.status_code)
             
-            # Look for the shared_data JSON in the HTML
-            match = re.search(r'<script type="text/javascript">window\._sharedData = (.*?);</script>', response.text)
-            if match:
-                shared_data = json.loads(match.group(1))
-                return shared_data
-            
-            # Alternative: look for the additional_data JSON
-            match = re.search(r'window\.__additionalDataLoaded\([^,]+,\s*(\{.*?\})\);', response.text)
-            if match:
-                additional_data = json.loads(match.group(1))
-                return additional_data
-            
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching from web: {e}")
-            return None
+            return self._extract_web_data(response.text)
+        except http_client.RequestException as e:
+            raise resilience.UpstreamError(f"Error fetching from web: {e}", "www.instagram.com") from e
         except json.JSONDecodeError as e:
-            print(f"Error decoding web response: {e}")
-            return None
+            raise resilience.ParseFailure(f"Error decoding web response: {e}", "www.instagram.com") from e
+    
+    def _extract_web_data(self, html):
+        """Extract the embedded profile JSON from an Instagram profile page"""
+        # Look for the shared_data JSON in the HTML
+        match = re.search(r'<script type="text/javascript">window\._sharedData = (.*?);</script>', html)
+        if match:
+            shared_data = json.loads(match.group(1))
+            return shared_data
+        
+        # Alternative: look for the additional_data JSON
+        match = re.search(r'window\.__additionalDataLoaded\([^,]+,\s*(\{.*?\})\);', html)
+        if match:
+            additional_data = json.loads(match.group(1))
+            return additional_data
+        
+        return None
     
     def _parse_api_data(self, api_data, profile_data):
         """Parse profile data from Instagram API response"""
         try:
             user = api_data['data']['user']
-            
-            # Extract basic profile information
-            if 'full_name' in user and user['full_name']:
-                profile_data['full_name'] = user['full_name']
-                print(f"Found full name: {profile_data['full_name']}")
-            
-            if 'biography' in user and user['biography']:
-                profile_data['biography'] = user['biography']
-                print(f"Found biography: {profile_data['biography'][:50]}...")
-            
-            if 'is_verified' in user:
-                profile_data['is_verified'] = str(user['is_verified']).lower()
-                print(f"Verification status: {profile_data['is_verified']}")
-            
-            if 'profile_pic_url_hd' in user and user['profile_pic_url_hd']:
-                profile_data['profile_pic_url_hd'] = user['profile_pic_url_hd']
-                print(f"Found profile picture URL")
-            
-            # Extract counts
-            if 'edge_followed_by' in user and 'count' in user['edge_followed_by']:
-                profile_data['followers'] = str(user['edge_followed_by']['count'])
-                print(f"Found followers count: {profile_data['followers']}")
-            
-            if 'edge_follow' in user and 'count' in user['edge_follow']:
-                profile_data['following'] = str(user['edge_follow']['count'])
-                print(f"Found following count: {profile_data['following']}")
-            
-            if 'edge_owner_to_timeline_media' in user and 'count' in user['edge_owner_to_timeline_media']:
-                profile_data['posts'] = str(user['edge_owner_to_timeline_media']['count'])
-                print(f"Found posts count: {profile_data['posts']}")
-            
-            # Extract category if available
-            if 'category_name' in user and user['category_name']:
-                profile_data['category'] = user['category_name']
-                print(f"Found category: {profile_data['category']}")
-            
-            # Check if it's a professional account
-            if 'is_business_account' in user:
-                profile_data['is_professional_account'] = str(user['is_business_account']).lower()
-                print(f"Professional account status: {profile_data['is_professional_account']}")
-            
-            # Extract engagement metrics from recent posts
-            if 'edge_owner_to_timeline_media' in user and 'edges' in user['edge_owner_to_timeline_media']:
-                posts = user['edge_owner_to_timeline_media']['edges']
-                like_counts = []
-                comment_counts = []
-                
-                for post in posts:
-                    if 'node' in post:
-                        node = post['node']
-                        if 'edge_liked_by' in node and 'count' in node['edge_liked_by']:
-                            like_counts.append(node['edge_liked_by']['count'])
-                        if 'edge_media_to_comment' in node and 'count' in node['edge_media_to_comment']:
-                            comment_counts.append(node['edge_media_to_comment']['count'])
-                
-                # Calculate average likes and comments
-                if like_counts:
-                    avg_likes = sum(like_counts) / len(like_counts)
-                    profile_data['average_likes'] = str(int(avg_likes))
-                    print(f"Average likes: {profile_data['average_likes']}")
-                
-                if comment_counts:
-                    avg_comments = sum(comment_counts) / len(comment_counts)
-                    profile_data['average_comments'] = str(int(avg_comments))
-                    print(f"Average comments: {profile_data['average_comments']}")
-            
-            # Calculate engagement rate
-            if profile_data['followers'] != "0" and profile_data['average_likes'] != "Not Available":
-                followers_count = self._extract_number(profile_data['followers'])
-                avg_likes_count = self._extract_number(profile_data['average_likes'])
-                
-                if followers_count > 0:
-                    engagement_rate = (avg_likes_count / followers_count) * 100
-                    profile_data['engagement_rate'] = round(engagement_rate, 1)
-                    print(f"Calculated engagement rate: {profile_data['engagement_rate']}%")
-            
+            self._apply_profile_plan(user, profile_data)
         except Exception as e:
-            print(f"Error parsing API data: {e}")
-            import traceback
-            traceback.print_exc()
+            self._log_parse_error("API", e)
         
         return profile_data
     
     def _parse_web_data(self, web_data, profile_data):
         """Parse profile data from Instagram website response"""
         try:
-            # Try to find user data in different possible locations in the JSON
-            user = None
-            
-            # Check in entry_data.ProfilePage[0].graphql.user
-            if 'entry_data' in web_data and 'ProfilePage' in web_data['entry_data'] and len(web_data['entry_data']['ProfilePage']) > 0:
-                if 'graphql' in web_data['entry_data']['ProfilePage'][0] and 'user' in web_data['entry_data']['ProfilePage'][0]['graphql']:
-                    user = web_data['entry_data']['ProfilePage'][0]['graphql']['user']
-            
-            # Check in graphql.user
-            if not user and 'graphql' in web_data and 'user' in web_data['graphql']:
-                user = web_data['graphql']['user']
-            
-            # Check in data.user
-            if not user and 'data' in web_data and 'user' in web_data['data']:
-                user = web_data['data']['user']
-            
+            user = self._find_web_user(web_data)
             if not user:
-                print("Could not find user data in web response")
+                self._log("Could not find user data in web response")
                 return profile_data
             
-            # Extract basic profile information
-            if 'full_name' in user and user['full_name']:
-                profile_data['full_name'] = user['full_name']
-                print(f"Found full name: {profile_data['full_name']}")
-            
-            if 'biography' in user and user['biography']:
-                profile_data['biography'] = user['biography']
-                print(f"Found biography: {profile_data['biography'][:50]}...")
-            
-            if 'is_verified' in user:
-                profile_data['is_verified'] = str(user['is_verified']).lower()
-                print(f"Verification status: {profile_data['is_verified']}")
-            
-            if 'profile_pic_url_hd' in user and user['profile_pic_url_hd']:
-                profile_data['profile_pic_url_hd'] = user['profile_pic_url_hd']
-                print(f"Found profile picture URL")
-            
-            # Extract counts
-            if 'edge_followed_by' in user and 'count' in user['edge_followed_by']:
-                profile_data['followers'] = str(user['edge_followed_by']['count'])
-                print(f"Found followers count: {profile_data['followers']}")
-            
-            if 'edge_follow' in user and 'count' in user['edge_follow']:
-                profile_data['following'] = str(user['edge_follow']['count'])
-                print(f"Found following count: {profile_data['following']}")
-            
-            if 'edge_owner_to_timeline_media' in user and 'count' in user['edge_owner_to_timeline_media']:
-                profile_data['posts'] = str(user['edge_owner_to_timeline_media']['count'])
-                print(f"Found posts count: {profile_data['posts']}")
-            
-            # Extract category if available
-            if 'category_name' in user and user['category_name']:
-                profile_data['category'] = user['category_name']
-                print(f"Found category: {profile_data['category']}")
-            
-            # Check if it's a professional account
-            if 'is_business_account' in user:
-                profile_data['is_professional_account'] = str(user['is_business_account']).lower()
-                print(f"Professional account status: {profile_data['is_professional_account']}")
-            
-            # Extract engagement metrics from recent posts
-            if 'edge_owner_to_timeline_media' in user and 'edges' in user['edge_owner_to_timeline_media']:
-                posts = user['edge_owner_to_timeline_media']['edges']
-                like_counts = []
-                comment_counts = []
-                
-                for post in posts:
-                    if 'node' in post:
-                        node = post['node']
-                        if 'edge_liked_by' in node and 'count' in node['edge_liked_by']:
-                            like_counts.append(node['edge_liked_by']['count'])
-                        if 'edge_media_to_comment' in node and 'count' in node['edge_media_to_comment']:
-                            comment_counts.append(node['edge_media_to_comment']['count'])
-                
-                # Calculate average likes and comments
-                if like_counts:
-                    avg_likes = sum(like_counts) / len(like_counts)
-                    profile_data['average_likes'] = str(int(avg_likes))
-                    print(f"Average likes: {profile_data['average_likes']}")
-                
-                if comment_counts:
-                    avg_comments = sum(comment_counts) / len(comment_counts)
-                    profile_data['average_comments'] = str(int(avg_comments))
-                    print(f"Average comments: {profile_data['average_comments']}")
-            
-            # Calculate engagement rate
-            if profile_data['followers'] != "0" and profile_data['average_likes'] != "Not Available":
-                followers_count = self._extract_number(profile_data['followers'])
-                avg_likes_count = self._extract_number(profile_data['average_likes'])
-                
-                if followers_count > 0:
-                    engagement_rate = (avg_likes_count / followers_count) * 100
-                    profile_data['engagement_rate'] = round(engagement_rate, 1)
-                    print(f"Calculated engagement rate: {profile_data['engagement_rate']}%")
-            
+            self._apply_profile_plan(user, profile_data)
         except Exception as e:
-            print(f"Error parsing web data: {e}")
-            import traceback
-            traceback.print_exc()
+            self._log_parse_error("web", e)
         
         return profile_data
     
-    def _extract_number(self, text):
-        """Extract numeric value from text that may contain K, M, B suffixes"""
-        if not text or text == "Not Available":
-            return 0
+    def _find_web_user(self, web_data):
+        """Find the user object in the different possible locations of the web JSON"""
+        # Check in entry_data.ProfilePage[0].graphql.user
+        if 'entry_data' in web_data and 'ProfilePage' in web_data['entry_data'] and len(web_data['entry_data']['ProfilePage']) > 0:
+            if 'graphql' in web_data['entry_data']['ProfilePage'][0] and 'user' in web_data['entry_data']['ProfilePage'][0]['graphql']:
+                return web_data['entry_data']['ProfilePage'][0]['graphql']['user']
         
-        # If it's already a number, just convert it
-        if isinstance(text, (int, float)):
-            return int(text)
+        # Check in graphql.user
+        if 'graphql' in web_data and 'user' in web_data['graphql']:
+            return web_data['graphql']['user']
         
-        text = str(text).strip().replace(',', '')
+        # Check in data.user
+        if 'data' in web_data and 'user' in web_data['data']:
+            return web_data['data']['user']
         
-        # Extract the numeric part with potential suffix
-        match = re.search(r'([\d.]+)\s*([KMBkmb])?', text)
-        if not match:
-            return 0
-        
-        value = float(match.group(1))
-        suffix = match.group(2).upper() if match.group(2) else ''
+        return None
+    
+    def _log_parse_error(self, source, error):
+        self._log(f"Error parsing {source} data: {error}")
+        if self.verbose:
+            import traceback
+            traceback.print_exc()
+    
+    def _record_from_user(self, user, username, source):
+        """Build the record for a user object, falling back to defaults if parsing fails"""
+        try:
+            return self._build_record(user, username)
+        except Exception as e:
+            self._log_parse_error(source, e)
+            return ProfileRecord('instagram', username=username)
+    
+    def _build_record(self, user, username):
+        """Build a ProfileRecord from a user object using the compiled field plan"""
+        record = ProfileRecord('instagram', username=username, **PROFILE_PLAN.apply(user))
         
-        if suffix == 'K':
-            value *= 1000
-        elif suffix == 'M':
-            value *= 1000000
-        elif suffix == 'B':
-            value *= 1000000000
+        # Like/comment averages over the recent posts in a single pass
+        media = user.get('edge_owner_to_timeline_media') or {}
+        record.average_likes, record.average_comments = average_post_counts(media.get('edges') or ())
         
-        return int(value)
+        # Engagement rate from the native counts
+        if record.followers and record.average_likes is not None:
+            record.engagement_rate = round((record.average_likes / record.followers) * 100, 1)
+        return record
+    
+    def _apply_profile_plan(self, user, profile_data):
+        """Fill profile_data from a user object using the compiled field plan"""
+        record = self._build_record(user, profile_data['username'])
+        profile_data.update(record.to_instagram_profile())
     
+    def download_profile_pic(self, profile_data, store=None):
+        """Save the HD profile picture as instagram/<username>_profile_pic.jpg, skipping unchanged avatars"""
+        url = profile_data.get('profile_pic_url_hd')
+        if not url or not url.startswith('http'):
+            return None
+        store = store or avatar_store.get_default_store()
+        try:
+            with metrics.stage('instagram', 'avatar'):
+                result = store.fetch('instagram', profile_data['username'], url)
+        except Exception as e:
+            self._log(f"Error downloading profile picture: {e}")
+            return 'error'
+        if result == 'downloaded':
+            self._log(f"Profile picture downloaded as {store.account_path('instagram', profile_data['username'])}")
+        elif result == 'error':
+            self._log("Error downloading profile picture")
+        return result
+    
+def fetch_record(username):
+    """Fetch and parse a profile into a ProfileRecord without printing or writing files.
+
+    Returns None for unknown accounts and raises resilience.UpstreamError for other failures.
+    """
+    return InstagramScraper(verbose=False).scrape_record(username, strict=True)
+
+def fetch_profile(username):
+    """Fetch and parse a profile without printing or writing files; None for unknown accounts"""
+    record = fetch_record(username)
+    return record.to_instagram_profile() if record else None
+
 def main():
     # Get username from command line arguments
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python scraper.py <username>")
-        sys.exit(1)
+    import argparse
+    parser = argparse.ArgumentParser(description="Instagram Profile Scraper")
+    parser.add_argument("username", type=str, help="Instagram username")
+    parser.add_argument("--download_pic", action="store_true", help="Save the profile picture as instagram/<username>_profile_pic.jpg")
+    parser.add_argument("--snapshots", type=str, metavar="DB", help="Record the profile in the SQLite snapshot store DB")
+    parser.add_argument("--egress", type=str, metavar="FILE", help="Spread requests over the proxies and header profiles in this JSON file")
+    import contextlib
+    import profiling
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.egress:
+        import egress
+        egress.load_config(args.egress)
     
-    username = sys.argv[1].strip()
+    username = args.username.strip()
     print(f"Scraping profile for username: {username}")
     
     # Create scraper instance and scrape profile
     scraper = InstagramScraper()
-    profile_data = scraper.scrape_profile(username)
+    profile_session = profiling.session_from_args(args)
+    with profile_session or contextlib.nullcontext():
+        scrape = profile_session.wrap(scraper.scrape_record) if profile_session else scraper.scrape_record
+        record = scrape(username)
+        profile_data = record.to_instagram_profile()
+        if args.download_pic:
+            scraper.download_profile_pic(profile_data)
+    if args.snapshots:
+        from snapshot_store import SnapshotStore
+        with SnapshotStore(args.snapshots) as snapshots:
+            snapshots.add(record)
     
     # Ensure we don't have duplicate keys in the output
     if 'url' in profile_data:
@@ -1,290 +1,500 @@
-import requests
+import http_client
+import archive
+import metrics
+import resilience
+from lazy_import import LazyModule
+from profile_record import ProfileRecord, TIKTOK_INFO_FIELDS, coerce_value
 import re
-import argparse
+import sys
+import json
+import contextlib
 import urllib.parse
-from bs4 import BeautifulSoup
 
-def get_user_info(identifier, by_id=False):
-    if by_id:
-        # URL for user ID
-        url = f"https://www.tiktok.com/@{identifier}"
-    else:
-        # Remove the @ symbol if present
-        if identifier.startswith('@'):
-            identifier = identifier[1:]
-        # URL for username
-        url = f"https://www.tiktok.com/@{identifier}"
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+# Only needed by --download_pic
+avatar_store = LazyModule('avatar_store')
+
+# Key of the embedded rehydration JSON object that carries the profile data
+USER_DETAIL_KEY = '"webapp.user-detail":'
+# user-detail statusCode values TikTok serves (with HTTP 200) for handles that don't exist or were banned
+USER_NOT_FOUND_CODES = {10202, 10221}
+
+# Output field -> (section, key) inside the decoded userInfo object
+USER_DETAIL_FIELDS = {
+    'user_id': ('user', 'id'),
+    'unique_id': ('user', 'uniqueId'),
+    'nickname': ('user', 'nickname'),
+    'followers': ('stats', 'followerCount'),
+    'following': ('stats', 'followingCount'),
+    'likes': ('stats', 'heartCount'),
+    'videos': ('stats', 'videoCount'),
+    'signature': ('user', 'signature'),
+    'verified': ('user', 'verified'),
+    'secUid': ('user', 'secUid'),
+    'commentSetting': ('user', 'commentSetting'),
+    'privateAccount': ('user', 'privateAccount'),
+    'region': ('user', 'region'),
+    'heart': ('stats', 'heart'),
+    'diggCount': ('stats', 'diggCount'),
+    'friendCount': ('stats', 'friendCount'),
+    'profile_pic': ('user', 'avatarLarger')
+}
+
+# Regular expressions used when the rehydration JSON is missing or incomplete; most pages never need them,
+# so each is compiled on first use
+FALLBACK_PATTERNS = {
+    'user_id': r'"webapp.user-detail":{"userInfo":{"user":{"id":"(\d+)"',
+    'unique_id': r'"uniqueId":"(.*?)"',
+    'nickname': r'"nickname":"(.*?)"',
+    'followers': r'"followerCount":(\d+)',
+    'following': r'"followingCount":(\d+)',
+    'likes': r'"heartCount":(\d+)',
+    'videos': r'"videoCount":(\d+)',
+    'signature': r'"signature":"(.*?)"',
+    'verified': r'"verified":(true|false)',
+    'secUid': r'"secUid":"(.*?)"',
+    'commentSetting': r'"commentSetting":(\d+)',
+    'privateAccount': r'"privateAccount":(true|false)',
+    'region': r'"ttSeller":false,"region":"([^"]*)"',
+    'heart': r'"heart":(\d+)',
+    'diggCount': r'"diggCount":(\d+)',
+    'friendCount': r'"friendCount":(\d+)',
+    'profile_pic': r'"avatarLarger":"(.*?)"'
+}
+
+_compiled_fallbacks = {}
+
+def fallback_pattern(key):
+    """Return the compiled fallback regex for a field, compiling it on first use"""
+    pattern = _compiled_fallbacks.get(key)
+    if pattern is None:
+        pattern = _compiled_fallbacks[key] = re.compile(FALLBACK_PATTERNS[key])
+    return pattern
+
+_json_decoder = json.JSONDecoder()
+
+def decode_user_detail(html_content):
+    """Decode only the embedded webapp.user-detail object, or return None"""
+    pos = html_content.find(USER_DETAIL_KEY)
+    if pos == -1:
+        return None
+    pos += len(USER_DETAIL_KEY)
+    # Skip any whitespace between the key and its value
+    while pos < len(html_content) and html_content[pos] in ' \t\r\n':
+        pos += 1
+    try:
+        user_detail, _ = _json_decoder.raw_decode(html_content, pos)
+    except ValueError:
+        return None
+    return user_detail if isinstance(user_detail, dict) else None
+
+def find_user_detail(html_content):
+    """Return the embedded webapp.user-detail userInfo object, or None"""
+    user_info = (decode_user_detail(html_content) or {}).get('userInfo')
+    return user_info if isinstance(user_info, dict) else None
+
+def user_detail_status(html_content):
+    """Return the webapp.user-detail statusCode (0 for a normal profile), or None if absent"""
+    status = (decode_user_detail(html_content) or {}).get('statusCode')
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def extract_profile_fields(html_content):
+    """Read the profile fields from the rehydration JSON, falling back to regex per missing field.
+
+    Returns {info key: native value}, with None for fields the page does not provide.
+    """
+    user_info = find_user_detail(html_content) or {}
+    sections = {
+        'user': user_info.get('user') or {},
+        # Newer pages may only ship the string-valued statsV2 block
+        'stats': user_info.get('stats') or user_info.get('statsV2') or {}
     }
 
-    response = requests.get(url, headers=headers)
+    values = {}
+    for key, name, kind in TIKTOK_INFO_FIELDS:
+        section, field = USER_DETAIL_FIELDS[key]
+        value = sections[section].get(field)
+        if value is None or value == '':
+            # Fall back to scanning the page for this single field
+            match = fallback_pattern(key).search(html_content)
+            value = match.group(1) if match else None
+        values[key] = coerce_value(value, kind)
+    return values
 
-    if response.status_code == 200:
-        html_content = response.text
-        
-        # Try to use lxml parser if available, otherwise use html.parser
-        try:
-            soup = BeautifulSoup(html_content, 'lxml')
-        except:
-            soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Regular expressions to extract information
-        patterns = {
-            'user_id': r'"webapp.user-detail":{"userInfo":{"user":{"id":"(\d+)"',
-            'unique_id': r'"uniqueId":"(.*?)"',
-            'nickname': r'"nickname":"(.*?)"',
-            'followers': r'"followerCount":(\d+)',
-            'following': r'"followingCount":(\d+)',
-            'likes': r'"heartCount":(\d+)',
-            'videos': r'"videoCount":(\d+)',
-            'signature': r'"signature":"(.*?)"',
-            'verified': r'"verified":(true|false)',
-            'secUid': r'"secUid":"(.*?)"',
-            'commentSetting': r'"commentSetting":(\d+)',
-            'privateAccount': r'"privateAccount":(true|false)',
-            'region': r'"ttSeller":false,"region":"([^"]*)"',
-            'heart': r'"heart":(\d+)',
-            'diggCount': r'"diggCount":(\d+)',
-            'friendCount': r'"friendCount":(\d+)',
-            'profile_pic': r'"avatarLarger":"(.*?)"'
-        }
-        
-        # Extract information using the defined patterns
-        info = {}
-        for key, pattern in patterns.items():
-            match = re.search(pattern, html_content)
-            info[key] = match.group(1) if match else f"No {key} found"
+# Single tokenizer for every markup/JSON construct that can carry a bio link.
+# Each alternative has exactly one named group so match.lastgroup identifies it.
+LINK_TOKEN_PATTERN = re.compile(
+    r'<a\b(?P<a_open>[^>]*)>'
+    r'|(?P<a_close></a>)'
+    r'|<span\b[^>]*class="[^"]*SpanLink[^"]*"[^>]*>(?P<span>[^<]+)</span>'
+    r'|scene=bio_url[^"]*?target=(?P<target>[^"&]+)'
+    r'|"bioLink":\{"link":"(?P<bio_link>[^"]+)","risk":\d+\}'
+    r'|"shareUrl":"(?P<share_url>[^"]+)"'
+)
+BIO_TARGET_PATTERN = re.compile(r'scene=bio_url[^"]*?target=([^"&]+)')
+
+# Social handles mentioned in the biography text: platform -> (pattern, output format)
+BIO_SOCIAL_PATTERNS = [
+    ('instagram', re.compile(r'[iI][gG]:\s*@?([a-zA-Z0-9._]+)'), "Instagram: @{}"),
+    ('snapchat', re.compile(r'(?:[sS][cC]|[sS]napchat):\s*@?([a-zA-Z0-9._]+)'), "Snapchat: {}"),
+    ('twitter', re.compile(r'(?:[tT]witter|[xX]):\s*@?([a-zA-Z0-9._]+)'), "Twitter/X: @{}"),
+    ('facebook', re.compile(r'[fF][bB]:\s*@?([a-zA-Z0-9._]+)'), "Facebook: {}"),
+    ('youtube', re.compile(r'(?:[yY][tT]|[yY]outube):\s*@?([a-zA-Z0-9._]+)'), "YouTube: {}"),
+    ('telegram', re.compile(r'[tT]elegram:\s*@?([a-zA-Z0-9._]+)'), "Telegram: @{}")
+]
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+
+def _normalize_link(value):
+    """Normalize a URL or link text so the same destination dedupes to one key"""
+    value = value.strip().lower()
+    for prefix in ('https://', 'http://', 'www.'):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    return value.rstrip('/')
+
+def extract_social_links(html_content, bio):
+    """Collect bio/website links and social handles with one scan over the page"""
+    anchor_links = []   # (text, target) from bio_url anchors
+    span_links = []     # SpanLink texts that look like URLs
+    bare_targets = []   # bio_url targets found outside an anchor tag
+    json_links = []     # bioLink / shareUrl values from the embedded JSON
+    abio_spans = []     # extra SpanLink texts inside ABioLink anchors
+
+    anchor_target = None
+    anchor_text = None
+    anchor_is_bio = False
+    for token in LINK_TOKEN_PATTERN.finditer(html_content):
+        kind = token.lastgroup
+        if kind == 'a_open':
+            attrs = token.group('a_open')
+            target_match = BIO_TARGET_PATTERN.search(attrs)
+            anchor_target = urllib.parse.unquote(target_match.group(1)) if target_match else None
+            anchor_text = None
+            anchor_is_bio = 'ABioLink' in attrs
+        elif kind == 'a_close':
+            if anchor_target:
+                anchor_links.append((anchor_text or anchor_target, anchor_target))
+            anchor_target = None
+            anchor_is_bio = False
+        elif kind == 'span':
+            span_text = token.group('span')
+            if anchor_target and anchor_text is None:
+                anchor_text = span_text
+            elif anchor_is_bio:
+                abio_spans.append(span_text)
+            elif '.' in span_text:
+                span_links.append(span_text)
+        elif kind == 'target':
+            bare_targets.append(urllib.parse.unquote(token.group('target')))
+        else:
+            json_links.append(token.group(kind).replace('\\u002F', '/'))
+
+    social_links = []
+    seen = set()
+
+    def add(entry, *keys):
+        normalized = [_normalize_link(key) for key in keys]
+        if not any(key in seen for key in normalized):
+            seen.update(normalized)
+            social_links.append(entry)
+
+    for link_text, target in anchor_links:
+        add(f"Link: {link_text} - {target}", target, link_text)
+    for span_text in span_links:
+        add(f"Link: {span_text} - {span_text}", span_text)
+    for target in bare_targets:
+        add(f"Link: {target} - {target}", target)
+    for link in json_links:
+        add(f"💎 **{link}**: `{link}`", link)
+    for span_text in abio_spans:
+        add(f"Link: {span_text} - {span_text}", span_text)
+
+    # Social networks and email addresses mentioned in the biography
+    for platform, pattern, template in BIO_SOCIAL_PATTERNS:
+        match = pattern.search(bio)
+        if match:
+            social_link = template.format(match.group(1))
+            add(social_link, social_link)
+
+    email_match = EMAIL_PATTERN.search(bio)
+    if email_match:
+        add(f"Email: {email_match.group(0)}", email_match.group(0))
+
+    return social_links
+
+def parse_user_record(html_content):
+    """Parse a TikTok profile page into a typed ProfileRecord"""
+    with metrics.stage('tiktok', 'parse'):
+        # Extract information from the embedded JSON (regex fallback per field)
+        values = extract_profile_fields(html_content)
         
         # Process profile pic URL
-        if "profile_pic" in info:
-            info['profile_pic'] = info['profile_pic'].replace('\\u002F', '/')
-        
-        # Initialize the list of social links
-        social_links = []
-        
-        # Get the biography content
-        bio = info.get('signature', "")
-        
-        # ============= SOCIAL LINKS EXTRACTION =============
-        
-        # METHOD 1: Extract links with target parameter
-        link_urls = re.findall(r'href="(https://www\.tiktok\.com/link/v2\?[^"]*?scene=bio_url[^"]*?target=([^"&]+))"', html_content)
-        for full_url, target in link_urls:
-            # Decode the target parameter
-            target_decoded = urllib.parse.unquote(target)
-            # Look for the text associated with this URL
-            text_pattern = rf'href="{re.escape(full_url)}"[^>]*>.*?<span[^>]*SpanLink[^>]*>([^<]+)</span>'
-            text_match = re.search(text_pattern, html_content, re.DOTALL)
-            if text_match:
-                link_text = text_match.group(1)
-            else:
-                # If we don't find the text, use the target as text
-                link_text = target_decoded
-                
-            # Add to social links if not already present
-            if not any(target_decoded in s for s in social_links):
-                social_links.append(f"Link: {link_text} - {target_decoded}")
-            
-        # METHOD 2: Find all SpanLink classes that look like URLs
-        span_links = re.findall(r'<span[^>]*class="[^"]*SpanLink[^"]*">([^<]+)</span>', html_content)
-        for span_text in span_links:
-            # Check if it looks like a URL (contains a dot and no spaces)
-            if '.' in span_text and ' ' not in span_text and not any(span_text in s for s in social_links):
-                social_links.append(f"Link: {span_text} - {span_text}")
-        
-        # METHOD 3: Find all target parameters in URLs
-        all_targets = re.findall(r'scene=bio_url[^"]*?target=([^"&]+)', html_content)
-        for target in all_targets:
-            target_decoded = urllib.parse.unquote(target)
-            if not any(target_decoded in s for s in social_links):
-                # Try to find the associated text
-                text_pattern = rf'target={re.escape(target)}[^>]*>.*?<span[^>]*>([^<]+)</span>'
-                text_match = re.search(text_pattern, html_content, re.DOTALL)
-                if text_match:
-                    link_text = text_match.group(1)
-                else:
-                    link_text = target_decoded
-                
-                social_links.append(f"Link: {link_text} - {target_decoded}")
-        
-        # METHOD 4: Extract bioLink links from JSON
-        bio_link_pattern = r'"bioLink":{"link":"([^"]+)","risk":(\d+)}'
-        bio_links_matches = re.findall(bio_link_pattern, html_content)
-
-        for link, risk in bio_links_matches:
-            # Clean escape characters in URLs
-            clean_link = link.replace('\\u002F', '/')
-            if not any(clean_link in s for s in social_links):
-                social_links.append(f"💎 **{clean_link}**: `{clean_link}`")
-
-        # Also search for links in other JSON data patterns
-        shared_links_pattern = r'"shareUrl":"([^"]+)"'
-        shared_links_matches = re.findall(shared_links_pattern, html_content)
-
-        for shared_url in shared_links_matches:
-            # Clean escape characters in URLs
-            clean_url = shared_url.replace('\\u002F', '/')
-            if not any(clean_url in s for s in social_links):
-                social_links.append(f"💎 **{clean_url}**: `{clean_url}`")
-
-        # Also search within divs containing DivShareLinks to ensure we capture all links
-        share_links_div_pattern = re.compile(r'<div[^>]*class="[^"]*DivShareLinks[^"]*"[^>]*>(.*?)</div>', re.DOTALL)
-        for div_match in share_links_div_pattern.finditer(html_content):
-            div_content = div_match.group(1)
-            
-            # Search for links inside these divs
-            div_links = re.finditer(r'<a[^>]*href="[^"]*scene=bio_url[^"]*target=([^"&]+)"[^>]*>.*?<span[^>]*class="[^"]*SpanLink[^"]*">([^<]+)</span>', div_content, re.DOTALL)
-            
-            for link_match in div_links:
-                target = urllib.parse.unquote(link_match.group(1))
-                link_text = link_match.group(2)
-                
-                if not any(target in s or link_text in s for s in social_links):
-                    social_links.append(f"💎 **{link_text}**: `{target}`")
-        
-        # Find spans with SpanLink class
-        span_matches = re.findall(r'<span[^>]*class="[^"]*SpanLink[^"]*">([^<]+)</span>', html_content)
-        for span_text in span_matches:
-            if '.' in span_text and not any(span_text in s for s in social_links):
-                # Looks like a link (contains a dot) and we don't have it yet
-                social_links.append(f"Link: {span_text} - {span_text}")
-        
-        # Look for a specific combination of ABioLink + SpanLink
-        biolink_matches = re.findall(r'class="[^"]*ABioLink[^"]*"[^>]*>.*?<span[^>]*class="[^"]*SpanLink[^"]*">([^<]+)</span>', html_content, re.DOTALL)
-        for span_text in biolink_matches:
-            if not any(span_text in s for s in social_links):
-                social_links.append(f"Link: {span_text} - {span_text}")
-        
-        # METHOD 5: Extract Instagram and other social networks mentioned in the bio
-        # Instagram
-        ig_pattern = re.search(r'[iI][gG]:\s*@?([a-zA-Z0-9._]+)', bio)
-        if ig_pattern:
-            instagram_username = ig_pattern.group(1)
-            if not any(f"Instagram: @{instagram_username}" in s for s in social_links):
-                social_links.append(f"Instagram: @{instagram_username}")
+        if values['profile_pic']:
+            values['profile_pic'] = values['profile_pic'].replace('\\u002F', '/')
         
-        # Other social networks in bio
-        social_patterns = {
-            'snapchat': r'([sS][cC]|[sS]napchat):\s*@?([a-zA-Z0-9._]+)',
-            'twitter': r'([tT]witter|[xX]):\s*@?([a-zA-Z0-9._]+)',
-            'facebook': r'[fF][bB]:\s*@?([a-zA-Z0-9._]+)',
-            'youtube': r'([yY][tT]|[yY]outube):\s*@?([a-zA-Z0-9._]+)',
-            'telegram': r'[tT]elegram:\s*@?([a-zA-Z0-9._]+)'
-        }
-        
-        for platform, pattern in social_patterns.items():
-            match = re.search(pattern, bio)
-            if match:
-                username = match.group(2) if len(match.groups()) > 1 else match.group(1)
-                if platform == 'snapchat':
-                    social_link = f"Snapchat: {username}"
-                elif platform == 'twitter':
-                    social_link = f"Twitter/X: @{username}"
-                elif platform == 'facebook':
-                    social_link = f"Facebook: {username}"
-                elif platform == 'youtube':
-                    social_link = f"YouTube: {username}"
-                elif platform == 'telegram':
-                    social_link = f"Telegram: @{username}"
-                
-                if not any(social_link in s for s in social_links):
-                    social_links.append(social_link)
-        
-        # Look for email addresses in the bio
-        email_pattern = re.search(r'[\w.+-]+@[\w-]+\.[\w.-]+', bio)
-        if email_pattern:
-            email = email_pattern.group(0)
-            if not any(email in s for s in social_links):
-                social_links.append(f"Email: {email}")
-        
-        # Add social links to the info dictionary
-        info['social_links'] = social_links
+        record = ProfileRecord('tiktok', **{name: values[key] for key, name, kind in TIKTOK_INFO_FIELDS})
+    
+    # Extract bio/website links and social handles in a single pass
+    with metrics.stage('tiktok', 'links'):
+        record.social_links = tuple(extract_social_links(html_content, record.biography or ""))
+    
+    # Calculate engagement rate
+    followers = record.followers or 0
+    likes = record.likes or 0
+    videos = record.posts or 0
+    if followers > 0:
+        # Basic engagement rate calculation: (likes / followers) * 100
+        record.engagement_rate = round((likes / followers) * 100, 2)
         
-        # Calculate engagement rate
+        # Advanced engagement rate calculation
+        # If videos count is available, calculate average likes per video
+        if videos > 0:
+            avg_likes_per_video = likes / videos
+            record.advanced_engagement_rate = round((avg_likes_per_video / followers) * 100, 2)
+        else:
+            record.advanced_engagement_rate = record.engagement_rate
+    else:
+        record.engagement_rate = 0
+        record.advanced_engagement_rate = 0
+    
+    return record
+
+def parse_user_info(html_content):
+    """Parse a TikTok profile page into the user info dictionary"""
+    return parse_user_record(html_content).to_tiktok_info()
+
+def print_user_info(info):
+    """Print the human-readable user information report"""
+    print(info)
+    # Print basic user information
+    print("\n=== User Information ===")
+    print(f"User ID: {info['user_id']}")
+    print(f"Username: {info['unique_id']}")
+    print(f"Nickname: {info['nickname']}")
+    print(f"Verified: {info['verified']}")
+    print(f"Private Account: {info['privateAccount']}")
+    print(f"Region: {info['region']}")
+    print(f"Followers: {info['followers']}")
+    print(f"Following: {info['following']}")
+    print(f"Likes: {info['likes']}")
+    print(f"Videos: {info['videos']}")
+    print(f"Friends: {info['friendCount']}")
+    print(f"Heart: {info['heart']}")
+    print(f"Digg Count: {info['diggCount']}")
+    print(f"SecUid: {info['secUid']}")
+    print(f"Basic Engagement Rate: {info['engagement_rate']}%")
+    print(f"Advanced Engagement Rate: {info['advanced_engagement_rate']}%")
+    
+    # Print biography
+    print("\n=== Biography ===")
+    print(info['signature'].replace('\\n', '\n'))
+    
+    # Print social links
+    if info['social_links']:
+        print("\n=== Social Links ===")
+        for link in info['social_links']:
+            print(link)
+    else:
+        print("\nNo social links found.")
+    
+    # Print TikTok profile link
+    print(f"\nTikTok Profile: https://www.tiktok.com/@{info['unique_id']}")
+
+def download_profile_pic(info, store=None):
+    """Save the profile picture as tiktok/<unique_id>_profile_pic.jpg, skipping unchanged avatars"""
+    if "profile_pic" in info and info["profile_pic"].startswith("http"):
+        store = store or avatar_store.get_default_store()
         try:
-            followers = int(info['followers']) if info['followers'] != 'No followers found' else 0
-            likes = int(info['likes']) if info['likes'] != 'No likes found' else 0
-            videos = int(info['videos']) if info['videos'] != 'No videos found' else 0
-            
-            if followers > 0:
-                # Basic engagement rate calculation: (likes / followers) * 100
-                basic_engagement_rate = (likes / followers) * 100
-                info['engagement_rate'] = round(basic_engagement_rate, 2)
-                
-                # Advanced engagement rate calculation
-                # If videos count is available, calculate average likes per video
-                if videos > 0:
-                    avg_likes_per_video = likes / videos
-                    advanced_engagement_rate = (avg_likes_per_video / followers) * 100
-                    info['advanced_engagement_rate'] = round(advanced_engagement_rate, 2)
-                else:
-                    info['advanced_engagement_rate'] = info['engagement_rate']
+            with metrics.stage('tiktok', 'avatar'):
+                result = store.fetch('tiktok', info['unique_id'], info["profile_pic"])
+            if result == 'downloaded':
+                print(f"\nProfile picture downloaded as {store.account_path('tiktok', info['unique_id'])}")
+            elif result in ('unchanged', 'not_modified'):
+                print(f"\nProfile picture unchanged: {store.account_path('tiktok', info['unique_id'])}")
             else:
-                info['engagement_rate'] = 0
-                info['advanced_engagement_rate'] = 0
-        except (ValueError, TypeError):
-            info['engagement_rate'] = 0
-            info['advanced_engagement_rate'] = 0
-            
-        print(info)
-        # Print basic user information
-        print("\n=== User Information ===")
-        print(f"User ID: {info['user_id']}")
-        print(f"Username: {info['unique_id']}")
-        print(f"Nickname: {info['nickname']}")
-        print(f"Verified: {info['verified']}")
-        print(f"Private Account: {info['privateAccount']}")
-        print(f"Region: {info['region']}")
-        print(f"Followers: {info['followers']}")
-        print(f"Following: {info['following']}")
-        print(f"Likes: {info['likes']}")
-        print(f"Videos: {info['videos']}")
-        print(f"Friends: {info['friendCount']}")
-        print(f"Heart: {info['heart']}")
-        print(f"Digg Count: {info['diggCount']}")
-        print(f"SecUid: {info['secUid']}")
-        print(f"Basic Engagement Rate: {info['engagement_rate']}%")
-        print(f"Advanced Engagement Rate: {info['advanced_engagement_rate']}%")
-        
-        # Print biography
-        print("\n=== Biography ===")
-        print(info['signature'].replace('\\n', '\n'))
-        
-        # Print social links
-        if social_links:
-            print("\n=== Social Links ===")
-            for link in social_links:
-                print(link)
-        else:
-            print("\nNo social links found.")
+                print("\nError downloading profile picture")
+        except Exception as e:
+            print(f"\nError downloading profile picture: {str(e)}")
+
+# Headers sent with every profile page request
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+def profile_url(identifier):
+    """Build the profile URL for a username (with or without @) or user ID"""
+    # Remove the @ symbol if present
+    if identifier.startswith('@'):
+        identifier = identifier[1:]
+    return f"https://www.tiktok.com/@{identifier}"
+
+def fetch_profile_page(identifier, by_id=False):
+    """Fetch the raw profile page response for a username or user ID"""
+    # Usernames and user IDs resolve through the same profile URL
+    url = profile_url(identifier)
+
+    with metrics.stage('tiktok', 'fetch'):
+        response = http_client.get(url, headers=REQUEST_HEADERS)
+    if response.status_code == 200:
+        # Keep the raw page only when the archive is enabled
+        archive.record_response('tiktok', 'page', identifier.lstrip('@'), url, response.content, response.status_code)
+    return response
+
+def fetch_user_record(identifier, by_id=False):
+    """Fetch and parse a profile into a ProfileRecord without printing or writing files.
+
+    Returns None for unknown accounts and raises resilience.UpstreamError for other failures.
+    """
+    try:
+        response = fetch_profile_page(identifier, by_id)
+    except http_client.RequestException as e:
+        raise resilience.UpstreamError(f"Error fetching profile: {e}", "www.tiktok.com") from e
+    try:
+        resilience.raise_for_status(response.status_code, response.headers, profile_url(identifier))
+    except resilience.NotFound:
+        return None
+    try:
+        return check_record(parse_user_record(response.text), response.text)
+    except resilience.NotFound:
+        return None
+
+def check_record(record, html_content=''):
+    """Raise NotFound, PrivateAccount or ParseFailure for a parsed page without profile counts"""
+    if record.followers is None:
+        # Unknown handles come back as a 200 page whose user-detail carries an error statusCode
+        if user_detail_status(html_content) in USER_NOT_FOUND_CODES:
+            raise resilience.NotFound(f"{record.username or 'The account'} does not exist", "www.tiktok.com")
+        if record.is_private:
+            raise resilience.PrivateAccount(f"{record.username} is private", "www.tiktok.com")
+        # Typically a captcha or verification page served instead of the profile
+        raise resilience.ParseFailure("The profile page held no profile data", "www.tiktok.com")
+    return record
+
+def fetch_user_info(identifier, by_id=False):
+    """Fetch and parse a profile without printing or writing files; None for unknown accounts"""
+    record = fetch_user_record(identifier, by_id)
+    return record.to_tiktok_info() if record else None
+
+def get_user_info(identifier, by_id=False, quiet=False, download_pic=False):
+    response = fetch_profile_page(identifier, by_id)
+
+    if response.status_code == 200:
+        info = parse_user_info(response.text)
         
-        # Print TikTok profile link
-        print(f"\nTikTok Profile: https://www.tiktok.com/@{info['unique_id']}")
-
-        # Download the profile picture
-        if "profile_pic" in info and info["profile_pic"].startswith("http"):
-            try:
-                profile_pic_response = requests.get(info["profile_pic"])
-                if profile_pic_response.status_code == 200:
-                    with open(f"{info['unique_id']}_profile_pic.jpg", "wb") as file:
-                        file.write(profile_pic_response.content)
-                    print(f"\nProfile picture downloaded as {info['unique_id']}_profile_pic.jpg")
-                else:
-                    print("\nError downloading profile picture")
-            except Exception as e:
-                print(f"\nError downloading profile picture: {str(e)}")
+        # Optional stages: the console report (skipped when quiet) and the avatar download
+        if not quiet:
+            print_user_info(info)
+        if download_pic:
+            download_profile_pic(info)
         
         return info
     else:
-        print(f"Error: Unable to fetch profile. Status code: {response.status_code}")
+        if not quiet:
+            print(f"Error: Unable to fetch profile. Status code: {response.status_code}")
         return None
 
+def read_identifiers(source):
+    """Read one identifier per line from a file path, or stdin when source is '-'"""
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    try:
+        for line in stream:
+            identifier = line.strip()
+            # Skip blank lines and comments
+            if identifier and not identifier.startswith('#'):
+                yield identifier
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch(identifiers, by_id=False, workers=8, output=None, snapshots=None, fetch=None):
+    """Fetch many profiles concurrently and stream one JSON line per profile as it completes"""
+    fetch = fetch or fetch_user_info
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    out = sys.stdout if output in (None, '-') else open(output, 'w', encoding='utf-8')
+    counts = {'succeeded': 0, 'failed': 0}
+
+    def write_result(future, identifier):
+        try:
+            info = future.result()
+            error = None if info else "User not found or unable to fetch profile"
+        except Exception as e:
+            info, error = None, str(e)
+
+        if error:
+            record = {'identifier': identifier, 'error': error}
+            counts['failed'] += 1
+        else:
+            record = {'identifier': identifier, 'info': info}
+            counts['succeeded'] += 1
+            if snapshots is not None:
+                snapshots.add(ProfileRecord.from_tiktok_info(info))
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        out.flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of lookups in flight so large inputs stream through
+            pending = {}
+            for identifier in identifiers:
+                pending[executor.submit(fetch, identifier, by_id)] = identifier
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write_result(future, pending.pop(future))
+            for future in wait(pending).done:
+                write_result(future, pending.pop(future))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if snapshots is not None:
+            snapshots.flush()
+
+    print(f"Batch finished: {counts['succeeded']} succeeded, {counts['failed']} failed", file=sys.stderr)
+    return counts['succeeded'], counts['failed']
+
 if __name__ == "__main__":
+    import argparse
     parser = argparse.ArgumentParser(description="Enhanced TikTok User Information Scraper")
-    parser.add_argument("identifier", type=str, help="TikTok username or user ID")
+    parser.add_argument("identifier", type=str, nargs="?", help="TikTok username or user ID")
     parser.add_argument("--by_id", action="store_true", help="Indicates if the provided identifier is a user ID")
+    parser.add_argument("--batch", type=str, metavar="FILE", help="Read identifiers (one per line) from FILE, or '-' for stdin, and output JSON lines")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent fetches in batch mode (default: 8)")
+    parser.add_argument("--output", type=str, metavar="FILE", help="Write batch JSON lines to FILE instead of stdout")
+    parser.add_argument("--timeout", type=float, help="HTTP connect/read timeout in seconds")
+    parser.add_argument("--download_pic", action="store_true", help="Save the profile picture as tiktok/<username>_profile_pic.jpg")
+    parser.add_argument("--archive", type=str, metavar="DIR", help="Store compressed raw responses in DIR for later replay")
+    parser.add_argument("--snapshots", type=str, metavar="DB", help="Record each fetched profile in the SQLite snapshot store DB")
+    parser.add_argument("--egress", type=str, metavar="FILE", help="Spread requests over the proxies and header profiles in this JSON file")
+    import profiling
+    profiling.add_profile_arguments(parser)
     args = parser.parse_args()
     
-    get_user_info(args.identifier, args.by_id)
+    http_client.configure(timeout=args.timeout)
+    if args.archive:
+        archive.configure(args.archive)
+    if args.egress:
+        import egress
+        egress.load_config(args.egress)
+    snapshots = None
+    if args.snapshots:
+        from snapshot_store import SnapshotStore
+        snapshots = SnapshotStore(args.snapshots)
+    if not args.batch and not args.identifier:
+        parser.error("an identifier or --batch FILE is required")
+    profile_session = profiling.session_from_args(args)
+    with profile_session or contextlib.nullcontext():
+        if args.batch:
+            # Keep at least one pooled connection per worker
+            http_client.configure(pool_maxsize=max(args.workers, http_client.settings['pool_maxsize']))
+            fetch = profile_session.wrap(fetch_user_info) if profile_session else None
+            run_batch(read_identifiers(args.batch), args.by_id, args.workers, args.output, snapshots, fetch)
+        else:
+            lookup = profile_session.wrap(get_user_info) if profile_session else get_user_info
+            info = lookup(args.identifier, args.by_id, download_pic=args.download_pic)
+            if info and snapshots is not None:
+                snapshots.add(ProfileRecord.from_tiktok_info(info))
+    if snapshots is not None:
+        snapshots.close()
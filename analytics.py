@@ -0,0 +1,190 @@
+import sys
+import csv
+import json
+import argparse
+
+from profile_record import ProfileRecord
+
+# numpy is optional for the scrapers themselves; only the bulk export needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Column name -> ProfileRecord attribute, in export order
+TEXT_COLUMNS = ('platform', 'username', 'user_id', 'region')
+COUNT_COLUMNS = ('followers', 'following', 'posts', 'likes', 'average_likes', 'average_comments')
+FLAG_COLUMNS = ('is_verified', 'is_private')
+METRIC_COLUMNS = ('engagement_rate', 'advanced_engagement_rate', 'follower_ratio', 'likes_per_post', 'comments_per_post')
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("analytics requires numpy (pip3 install numpy)")
+
+class ProfileTable:
+    """Column-oriented set of scraped profiles with vectorized engagement metrics.
+
+    Counts and flags are float64 arrays with NaN for values the scraper did not
+    find, text fields are unicode arrays. Metrics are computed for every row at
+    once by compute_metrics() instead of one profile at a time.
+    """
+
+    def __init__(self, columns):
+        _require_numpy()
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['platform'])
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from ProfileRecords"""
+        _require_numpy()
+        records = list(records)
+        columns = {}
+        for name in TEXT_COLUMNS:
+            columns[name] = np.array([getattr(record, name) or '' for record in records], dtype=str)
+        # None becomes NaN when converted to float64
+        for name in COUNT_COLUMNS + FLAG_COLUMNS:
+            columns[name] = np.array([getattr(record, name) for record in records], dtype=np.float64)
+        return cls(columns)
+
+    @classmethod
+    def from_jsonl(cls, paths):
+        """Build a table from JSONL files of TikTok or batch_runner results, profile dicts or record dicts"""
+        return cls.from_records(record for path in paths for record in read_records(path))
+
+    @classmethod
+    def load(cls, path):
+        """Load a table written by write_npz()"""
+        _require_numpy()
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def compute_metrics(self):
+        """Add the engagement, ratio and per-post columns, mirroring the scrapers' formulas"""
+        c = self.columns
+        tiktok = c['platform'] == 'tiktok'
+        followers = c['followers']
+        has_followers = followers > 0
+        has_posts = c['posts'] > 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # TikTok only reports lifetime likes; Instagram reports per-post averages
+            likes_per_post = np.where(tiktok, np.where(has_posts, c['likes'] / c['posts'], np.nan), c['average_likes'])
+            comments_per_post = np.where(tiktok, np.nan, c['average_comments'])
+
+            # TikTok: (likes / followers) * 100, Instagram: (average likes / followers) * 100
+            engaged = np.where(tiktok, c['likes'], c['average_likes'])
+            engagement_rate = np.where(has_followers, engaged / followers * 100, 0.0)
+
+            # Average likes per video against followers, falling back to the basic rate without videos
+            advanced = np.where(np.isnan(likes_per_post), engagement_rate, likes_per_post / followers * 100)
+            advanced_engagement_rate = np.where(has_followers, advanced, 0.0)
+
+            follower_ratio = np.where(c['following'] > 0, followers / c['following'], np.nan)
+
+        c['engagement_rate'] = np.nan_to_num(engagement_rate)
+        c['advanced_engagement_rate'] = np.nan_to_num(advanced_engagement_rate)
+        c['follower_ratio'] = follower_ratio
+        c['likes_per_post'] = likes_per_post
+        c['comments_per_post'] = comments_per_post
+        return self
+
+    def _formatted_columns(self):
+        """Render every column to strings with vectorized formatting, empty for NaN"""
+        formatted = []
+        for name in self.export_columns():
+            values = self.columns[name]
+            if values.dtype.kind == 'U':
+                formatted.append(values)
+                continue
+            missing = np.isnan(values)
+            filled = np.where(missing, 0, values)
+            if name in FLAG_COLUMNS:
+                text = np.where(filled > 0, 'true', 'false')
+            elif name in COUNT_COLUMNS:
+                text = np.char.mod('%d', filled.astype(np.int64))
+            else:
+                text = np.char.mod('%.2f', filled)
+            formatted.append(np.where(missing, '', text))
+        return formatted
+
+    def export_columns(self):
+        return [name for name in TEXT_COLUMNS + COUNT_COLUMNS + FLAG_COLUMNS + METRIC_COLUMNS if name in self.columns]
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.export_columns())
+            writer.writerows(zip(*(column.tolist() for column in self._formatted_columns())))
+
+    def write_npz(self, path):
+        """Write every column to a compressed .npz archive (readable without pickle)"""
+        np.savez_compressed(path, **{name: self.columns[name] for name in self.export_columns()})
+
+    def export(self, csv_path=None, npz_path=None):
+        """Compute the metrics once and write the requested outputs"""
+        if 'engagement_rate' not in self.columns:
+            self.compute_metrics()
+        if csv_path:
+            self.write_csv(csv_path)
+        if npz_path:
+            self.write_npz(npz_path)
+
+def record_from_json(value):
+    """Convert one JSON line to a ProfileRecord, or None for failed lookups"""
+    if 'info' in value:
+        # TikTok.py --batch output
+        return ProfileRecord.from_tiktok_info(value['info'])
+    if 'record' in value:
+        # batch_runner.py export output
+        return ProfileRecord.from_dict(value['record'])
+    if 'error' in value:
+        return None
+    if 'instagram_url' in value:
+        # InstagramScraper.scrape_profile() output
+        return ProfileRecord.from_instagram_profile(value)
+    if 'unique_id' in value:
+        # TikTok get_user_info() output
+        return ProfileRecord.from_tiktok_info(value)
+    return ProfileRecord.from_dict(value)
+
+def read_records(path):
+    """Yield ProfileRecords from a JSONL file, '-' for stdin"""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = record_from_json(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping {path}:{line_number}: {e}", file=sys.stderr)
+                continue
+            if record is not None:
+                yield record
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk engagement metrics and columnar export of scraped profiles")
+    parser.add_argument("inputs", nargs="+", help="JSONL files of scraped profiles (TikTok --batch or batch_runner.py export output, profile or record dicts); '-' for stdin")
+    parser.add_argument("--csv", help="Write the table with metrics as CSV")
+    parser.add_argument("--npz", help="Write the table with metrics as a compressed NumPy .npz archive")
+    args = parser.parse_args()
+
+    if np is None:
+        print("Error: analytics requires numpy (pip3 install numpy)")
+        sys.exit(1)
+    if not args.csv and not args.npz:
+        parser.error("at least one of --csv or --npz is required")
+
+    table = ProfileTable.from_jsonl(args.inputs)
+    table.export(args.csv, args.npz)
+    print(f"Exported {len(table)} profiles")
+
+if __name__ == "__main__":
+    main()
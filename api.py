@@ -1,112 +1,385 @@
-from flask import Flask, request, jsonify
-from TikTok import get_user_info
-from Instagram import InstagramScraper
+from flask import Flask, Response, request, jsonify, stream_with_context, g
+import egress
+import metrics
+import resilience
+from lazy_import import LazyModule
+from cache import ProfileCache
+from profile_record import ProfileRecord
+from jobs import BackgroundJobs
 import argparse
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# The scrapers (and requests behind them) load on the first lookup, not at startup
+TikTok = LazyModule('TikTok')
+Instagram = LazyModule('Instagram')
+http_client = LazyModule('http_client')
+archive = LazyModule('archive')
 
 app = Flask(__name__)
 
-@app.route('/tiktok/user_info/<identifier>', methods=['GET'])
-def api_get_user_info(identifier):
-    by_id = request.args.get('by_id', 'false').lower() == 'true'
-    
+API_REQUEST_SECONDS = metrics.Histogram('api_request_seconds', 'API request latency by route and status code',
+                                        ('route', 'status'))
+API_IN_FLIGHT = metrics.Gauge('api_requests_in_flight', 'API requests currently being handled')
+API_LOOKUPS = metrics.Counter('api_lookups_total', 'Profile lookups by platform and result status code',
+                              ('platform', 'status'))
+
+def make_profile_cache(ttl, max_size, disk_dir):
+    """Build the cache of ProfileRecords, stored as their native dicts on disk"""
+    return ProfileCache(ttl=ttl, max_size=max_size, disk_dir=disk_dir,
+                        serialize=ProfileRecord.to_dict, deserialize=ProfileRecord.from_dict)
+
+# Shared profile cache; reconfigured from the command line in __main__
+profile_cache = make_profile_cache(
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', 300)),
+    max_size=int(os.environ.get('PROFILE_CACHE_SIZE', 1024)),
+    disk_dir=os.environ.get('PROFILE_CACHE_DIR') or None
+)
+
+# Concurrency cap shared by every batch request, and the largest accepted batch
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 500))
+
+# Optional post-fetch stages; they run on a bounded background queue, never in the request
+DOWNLOAD_AVATARS = os.environ.get('API_DOWNLOAD_AVATARS', 'false').lower() == 'true'
+PRINT_REPORTS = os.environ.get('API_PRINT_REPORTS', 'false').lower() == 'true'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 256))
+background_jobs = BackgroundJobs(workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, name='api-jobs')
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def get_batch_executor():
+    """Return the shared thread pool used by the batch endpoints"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+        return _batch_executor
+
+def schedule_tiktok_stages(record):
+    """Queue the optional report/avatar stages for a freshly fetched TikTok profile"""
+    if PRINT_REPORTS:
+        background_jobs.submit(TikTok.print_user_info, record.to_tiktok_info())
+    if DOWNLOAD_AVATARS:
+        background_jobs.submit(TikTok.download_profile_pic, record.to_tiktok_info())
+
+def schedule_instagram_stages(record):
+    """Queue the optional report/avatar stages for a freshly fetched Instagram profile"""
+    if PRINT_REPORTS:
+        background_jobs.submit(print, json.dumps(record.to_instagram_profile(), indent=2, ensure_ascii=False))
+    if DOWNLOAD_AVATARS:
+        background_jobs.submit(Instagram.InstagramScraper(verbose=False).download_profile_pic, record.to_instagram_profile())
+
+def fetch_tiktok_user(identifier, by_id=False):
+    """Fetch a TikTok profile through the shared cache as a user info dict"""
+    def fetch():
+        record = TikTok.fetch_user_record(identifier, by_id=by_id)
+        if record:
+            schedule_tiktok_stages(record)
+        return record
+    record = profile_cache.get_or_fetch('tiktok', identifier, fetch)
+    return record.to_tiktok_info() if record else None
+
+def fetch_instagram_user(username):
+    """Fetch an Instagram profile through the shared cache as a profile dict"""
+    def fetch():
+        record = Instagram.fetch_record(username)
+        if record:
+            schedule_instagram_stages(record)
+        return record
+    record = profile_cache.get_or_fetch('instagram', username, fetch)
+    return record.to_instagram_profile() if record else None
+
+def format_tiktok_user_info(user_data, identifier):
+    """Map TikTok user info to the common API response shape"""
+    return {
+        'platform': 'tiktok',
+        'username': user_data.get('unique_id', identifier),
+        'full_name': user_data.get('nickname', 'Not Available'),
+        'biography': user_data.get('signature', 'Not Available'),
+        'country': user_data.get('region', 'Not Available'),
+        'url': f"https://www.tiktok.com/@{user_data.get('unique_id', identifier)}",
+        'category': 'Not Available',
+        'followers': user_data.get('followers', 'Not Available'),
+        'following': user_data.get('following', 'Not Available'),
+        'posts': user_data.get('videos', 'Not Available'),
+        'is_verified': user_data.get('verified', 'Not Available'),
+        'is_professional_account': 'Not Available',
+        'average_likes': user_data.get('likes', 'Not Available'),
+        'average_comments': 'Not Available',
+        'engagement_rate': user_data.get('advanced_engagement_rate', 'Not Available'),
+        'profile_pic_url_hd': user_data.get('profile_pic', 'Not Available')
+    }
+
+def format_instagram_user_info(user_data, username):
+    """Map Instagram profile data to the common API response shape"""
+    return {
+        'platform': 'instagram',
+        'username': username,
+        'full_name': user_data.get('full_name', 'Not Available'),
+        'biography': user_data.get('biography', 'Not Available'),
+        'country': 'Not Available',
+        'url': f"https://www.instagram.com/{username}/",
+        'category': user_data.get('category', 'Not Available'),
+        'followers': user_data.get('followers', 'Not Available'),
+        'following': user_data.get('following', 'Not Available'),
+        'posts': user_data.get('posts', 'Not Available'),
+        'is_verified': user_data.get('is_verified', 'Not Available'),
+        'is_professional_account': user_data.get('is_professional_account', 'Not Available'),
+        'average_likes': user_data.get('average_likes', 'Not Available'),
+        'average_comments': user_data.get('average_comments', 'Not Available'),
+        'engagement_rate': user_data.get('engagement_rate', 'Not Available'),
+        'profile_pic_url_hd': user_data.get('profile_pic_url_hd', 'Not Available')
+    }
+
+def format_tiktok_engagement(user_data, identifier):
+    """Map TikTok user info to the engagement response shape, with both rates explained"""
+    return {
+        'username': user_data.get('unique_id', identifier),
+        'full_name': user_data.get('nickname', 'Not Available'),
+        'biography': user_data.get('signature', 'Not Available'),
+        'country': user_data.get('region', 'Not Available'),
+        'url': f"https://www.tiktok.com/@{user_data.get('unique_id', identifier)}",
+        'category': 'Not Available',
+        'followers': user_data.get('followers', 'Not Available'),
+        'following': user_data.get('following', 'Not Available'),
+        'posts': user_data.get('videos', 'Not Available'),
+        'is_verified': user_data.get('verified', 'Not Available'),
+        'is_professional_account': 'Not Available',
+        'average_likes': user_data.get('likes', 'Not Available'),
+        'average_comments': 'Not Available',
+        'engagement_rate': user_data.get('engagement_rate', 'Not Available'),
+        'basic_engagement_rate': user_data.get('engagement_rate', 'Not Available'),
+        'advanced_engagement_rate': user_data.get('advanced_engagement_rate', 'Not Available'),
+        'profile_pic_url_hd': user_data.get('profile_pic', 'Not Available'),
+        'description': {
+            'basic': "(likes / followers) * 100",
+            'advanced': "(avg likes per video / followers) * 100"
+        }
+    }
+
+def error_result(error):
+    """Map a classified upstream failure to (payload, status_code)"""
+    payload = {"error": str(error), "reason": error.reason}
+    if error.retry_after is not None:
+        payload['retry_after'] = round(error.retry_after, 1)
+    return payload, error.status
+
+def lookup_tiktok(identifier, by_id=False, format_info=format_tiktok_user_info):
+    """Return (payload, status_code) for one TikTok identifier"""
     try:
-        user_data = get_user_info(identifier, by_id=by_id)
+        user_data = fetch_tiktok_user(identifier, by_id=by_id)
         if user_data:
-            formatted_data = {
-                'platform': 'tiktok',
-                'username': user_data.get('unique_id', identifier),
-                'full_name': user_data.get('nickname', 'Not Available'),
-                'biography': user_data.get('signature', 'Not Available'),
-                'country': user_data.get('region', 'Not Available'),
-                'url': f"https://www.tiktok.com/@{user_data.get('unique_id', identifier)}",
-                'category': 'Not Available',
-                'followers': user_data.get('followers', 'Not Available'),
-                'following': user_data.get('following', 'Not Available'),
-                'posts': user_data.get('videos', 'Not Available'),
-                'is_verified': user_data.get('verified', 'Not Available'),
-                'is_professional_account': 'Not Available',
-                'average_likes': user_data.get('likes', 'Not Available'),
-                'average_comments': 'Not Available',
-                'engagement_rate': user_data.get('advanced_engagement_rate', 'Not Available'),
-                'profile_pic_url_hd': user_data.get('profile_pic', 'Not Available')
-            }
-            return jsonify(formatted_data), 200
+            result = format_info(user_data, identifier), 200
         else:
-            return jsonify({"error": "User not found or unable to fetch profile"}), 404
+            result = {"error": "User not found or unable to fetch profile"}, 404
+    except resilience.UpstreamError as e:
+        result = error_result(e)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        result = {"error": str(e)}, 500
+    API_LOOKUPS.inc(platform='tiktok', status=result[1])
+    return result
 
-@app.route('/tiktok/engagement_rate/<identifier>', methods=['GET'])
-def api_get_engagement_rate(identifier):
-    by_id = request.args.get('by_id', 'false').lower() == 'true'
-    
+def lookup_instagram(username):
+    """Return (payload, status_code) for one Instagram username"""
     try:
-        user_data = get_user_info(identifier, by_id=by_id)
-        if user_data and 'engagement_rate' in user_data:
-            formatted_data = {
-                'username': user_data.get('unique_id', identifier),
-                'full_name': user_data.get('nickname', 'Not Available'),
-                'biography': user_data.get('signature', 'Not Available'),
-                'country': user_data.get('region', 'Not Available'),
-                'url': f"https://www.tiktok.com/@{user_data.get('unique_id', identifier)}",
-                'category': 'Not Available',
-                'followers': user_data.get('followers', 'Not Available'),
-                'following': user_data.get('following', 'Not Available'),
-                'posts': user_data.get('videos', 'Not Available'),
-                'is_verified': user_data.get('verified', 'Not Available'),
-                'is_professional_account': 'Not Available',
-                'average_likes': user_data.get('likes', 'Not Available'),
-                'average_comments': 'Not Available',
-                'engagement_rate': user_data.get('engagement_rate', 'Not Available'),
-                'basic_engagement_rate': user_data.get('engagement_rate', 'Not Available'),
-                'advanced_engagement_rate': user_data.get('advanced_engagement_rate', 'Not Available'),
-                'profile_pic_url_hd': user_data.get('profile_pic', 'Not Available'),
-                'description': {
-                    'basic': "(likes / followers) * 100",
-                    'advanced': "(avg likes per video / followers) * 100"
-                }
-            }
-            return jsonify(formatted_data), 200
+        user_data = fetch_instagram_user(username)
+        if user_data:
+            result = format_instagram_user_info(user_data, username), 200
         else:
-            return jsonify({"error": "User not found or unable to fetch profile"}), 404
+            result = {"error": "User not found or unable to fetch profile"}, 404
+    except resilience.UpstreamError as e:
+        result = error_result(e)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        result = {"error": str(e)}, 500
+    API_LOOKUPS.inc(platform='instagram', status=result[1])
+    return result
+
+def json_response(platform, payload, status):
+    """jsonify a payload, timed as the platform's serialize stage"""
+    with metrics.stage(platform, 'serialize'):
+        response = jsonify(payload)
+    if 'retry_after' in payload:
+        # Throttled upstream: tell clients when a retry can succeed
+        response.headers['Retry-After'] = str(int(payload['retry_after'] + 0.999))
+    return response, status
+
+@app.route('/tiktok/user_info/<identifier>', methods=['GET'])
+def api_get_user_info(identifier):
+    by_id = request.args.get('by_id', 'false').lower() == 'true'
+    payload, status = lookup_tiktok(identifier, by_id=by_id)
+    return json_response('tiktok', payload, status)
+
+@app.route('/tiktok/engagement_rate/<identifier>', methods=['GET'])
+def api_get_engagement_rate(identifier):
+    by_id = request.args.get('by_id', 'false').lower() == 'true'
+    payload, status = lookup_tiktok(identifier, by_id=by_id, format_info=format_tiktok_engagement)
+    return json_response('tiktok', payload, status)
 
 @app.route('/instagram/user_info/<username>', methods=['GET'])
 def api_get_instagram_user_info(username):
-    try:
-        scraper = InstagramScraper()
-        user_data = scraper.scrape_profile(username)
-        
-        if user_data:
-            formatted_data = {
-                'platform': 'instagram',
-                'username': username,
-                'full_name': user_data.get('full_name', 'Not Available'),
-                'biography': user_data.get('biography', 'Not Available'),
-                'country': 'Not Available',
-                'url': f"https://www.instagram.com/{username}/",
-                'category': user_data.get('category', 'Not Available'),
-                'followers': user_data.get('followers', 'Not Available'),
-                'following': user_data.get('following', 'Not Available'),
-                'posts': user_data.get('posts', 'Not Available'),
-                'is_verified': user_data.get('is_verified', 'Not Available'),
-                'is_professional_account': user_data.get('is_professional_account', 'Not Available'),
-                'average_likes': user_data.get('average_likes', 'Not Available'),
-                'average_comments': user_data.get('average_comments', 'Not Available'),
-                'engagement_rate': user_data.get('engagement_rate', 'Not Available'),
-                'profile_pic_url_hd': user_data.get('profile_pic_url_hd', 'Not Available')
-            }
-            return jsonify(formatted_data), 200
+    payload, status = lookup_instagram(username)
+    return json_response('instagram', payload, status)
+
+def run_batch_lookup(lookup, identifiers):
+    """Fan a batch of lookups out over the shared executor, yielding item results as they complete"""
+    executor = get_batch_executor()
+    futures = {executor.submit(lookup, identifier): (index, identifier) for index, identifier in enumerate(identifiers)}
+    for future in as_completed(futures):
+        index, identifier = futures[future]
+        payload, status = future.result()
+        item = {'identifier': identifier, 'status': status}
+        if status == 200:
+            item['data'] = payload
         else:
-            return jsonify({"error": "User not found or unable to fetch profile"}), 404
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            item['error'] = payload.get('error')
+            if 'reason' in payload:
+                item['reason'] = payload['reason']
+        yield index, item
 
-if __name__ == '__main__':
+def batch_response(platform, lookup):
+    """Validate a batch request body and return all results, or stream them as NDJSON"""
+    body = request.get_json(silent=True) or {}
+    identifiers = body.get('identifiers')
+    if not isinstance(identifiers, list) or not all(isinstance(i, str) and i.strip() for i in identifiers):
+        return jsonify({"error": "Request body must contain 'identifiers', a list of non-empty strings"}), 400
+    if len(identifiers) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} identifiers are allowed per batch"}), 400
+
+    stream = body.get('stream', False) or request.args.get('stream', 'false').lower() == 'true'
+    if stream:
+        # Chunked NDJSON: one line per profile in completion order
+        def generate():
+            for _, item in run_batch_lookup(lookup, identifiers):
+                with metrics.stage(platform, 'serialize'):
+                    line = json.dumps(item, ensure_ascii=False) + '\n'
+                yield line
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = [None] * len(identifiers)
+    for index, item in run_batch_lookup(lookup, identifiers):
+        results[index] = item
+    return json_response(platform, {'results': results}, 200)
+
+@app.route('/tiktok/user_info/batch', methods=['POST'])
+def api_get_user_info_batch():
+    by_id = bool((request.get_json(silent=True) or {}).get('by_id', False))
+    return batch_response('tiktok', lambda identifier: lookup_tiktok(identifier, by_id=by_id))
+
+@app.route('/instagram/user_info/batch', methods=['POST'])
+def api_get_instagram_user_info_batch():
+    return batch_response('instagram', lookup_instagram)
+
+@app.route('/cache/stats', methods=['GET'])
+def api_get_cache_stats():
+    return jsonify(profile_cache.stats()), 200
+
+@app.route('/jobs/stats', methods=['GET'])
+def api_get_job_stats():
+    return jsonify(background_jobs.stats()), 200
+
+@app.route('/egress/stats', methods=['GET'])
+def api_get_egress_stats():
+    return jsonify(egress.stats()), 200
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    API_IN_FLIGHT.inc()
+
+@app.teardown_request
+def finish_request_timer(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    API_IN_FLIGHT.dec()
+    status = 500 if exc is not None else getattr(g, 'response_status', 500)
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    API_REQUEST_SECONDS.observe(time.perf_counter() - start, route=rule, status=status)
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+def collect_service_metrics():
+    """Export the cache and background job counters at scrape time"""
+    cache_stats = profile_cache.stats()
+    job_stats = background_jobs.stats()
+    return [
+        ('profile_cache_hits_total', 'counter', 'Profile cache hits (memory and disk)', [({}, cache_stats['hits'])]),
+        ('profile_cache_misses_total', 'counter', 'Profile cache misses', [({}, cache_stats['misses'])]),
+        ('profile_cache_disk_hits_total', 'counter', 'Profile cache hits served from the disk tier', [({}, cache_stats['disk_hits'])]),
+        ('profile_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit', [({}, cache_stats['hit_rate'])]),
+        ('profile_cache_size', 'gauge', 'Profiles held in memory', [({}, cache_stats['size'])]),
+        ('profile_fetches_coalesced_total', 'counter', 'Lookups that joined an in-flight upstream fetch',
+         [({}, cache_stats['fetches']['coalesced'] + cache_stats['async_fetches']['coalesced'])]),
+        ('profile_fetches_in_flight', 'gauge', 'Distinct upstream profile fetches in progress',
+         [({}, cache_stats['fetches']['in_flight'] + cache_stats['async_fetches']['in_flight'])]),
+        ('background_jobs_total', 'counter', 'Background stage jobs by outcome',
+         [({'outcome': outcome}, job_stats[outcome]) for outcome in ('completed', 'failed', 'dropped')]),
+        ('background_jobs_pending', 'gauge', 'Background stage jobs queued or running', [({}, job_stats['pending'])])
+    ]
+
+metrics.REGISTRY.add_collector(collect_service_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def api_get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def build_arg_parser():
     parser = argparse.ArgumentParser(description="Social Media User Info API")
     parser.add_argument('--host', type=str, default='127.0.0.1', help='Host to run the API on.')
     parser.add_argument('--port', type=int, default=5000, help='Port to run the API on.')
-    args = parser.parse_args()
-    
-    app.run(host=args.host, port=args.port, debug=True)
\ No newline at end of file
+    parser.add_argument('--pool-size', type=int, help='Maximum kept-alive upstream connections per host.')
+    parser.add_argument('--timeout', type=float, help='Upstream HTTP connect/read timeout in seconds.')
+    parser.add_argument('--retries', type=int, help='Attempts per upstream request on 429, 5xx or connection errors (default 3).')
+    parser.add_argument('--cache-ttl', type=float, default=profile_cache.ttl, help='Seconds a cached profile stays fresh.')
+    parser.add_argument('--cache-size', type=int, default=profile_cache.max_size, help='Maximum number of profiles kept in memory.')
+    parser.add_argument('--archive-dir', type=str, help='Store compressed raw upstream responses in this directory.')
+    parser.add_argument('--egress', type=str, metavar='FILE', help='Spread upstream requests over the proxies and header profiles in this JSON file.')
+    parser.add_argument('--download-avatars', action='store_true', default=DOWNLOAD_AVATARS, help='Download profile pictures in the background after each upstream fetch.')
+    parser.add_argument('--print-reports', action='store_true', default=PRINT_REPORTS, help='Print the console report in the background after each upstream fetch.')
+    parser.add_argument('--job-workers', type=int, default=JOB_WORKERS, help='Threads running background stages.')
+    parser.add_argument('--job-queue-size', type=int, default=JOB_QUEUE_SIZE, help='Maximum queued background stages; extra ones are dropped.')
+    parser.add_argument('--batch-workers', type=int, default=BATCH_WORKERS, help='Maximum parallel upstream lookups across batch requests.')
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE, help='Maximum identifiers accepted per batch request.')
+    parser.add_argument('--cache-dir', type=str, default=profile_cache.disk_dir, help='Directory for the on-disk cache tier (disabled if omitted).')
+    parser.add_argument('--async', dest='async_mode', action='store_true', help='Serve with the asyncio server (async_api.py, needs aiohttp) instead of the Flask development server.')
+    parser.add_argument('--workers', type=int, default=1, help='With --async, number of server processes sharing the port.')
+    parser.add_argument('--parse-workers', type=int, default=4, help='With --async, threads per process that parse fetched pages.')
+    parser.add_argument('--shutdown-timeout', type=float, default=30.0, help='With --async, seconds in-flight requests get to finish on shutdown.')
+    return parser
+
+def configure_service(args):
+    """Apply the command line options to this module's shared state"""
+    global profile_cache, BATCH_WORKERS, DOWNLOAD_AVATARS, PRINT_REPORTS, background_jobs, MAX_BATCH_SIZE
+    http_client.configure(pool_maxsize=args.pool_size, timeout=args.timeout)
+    resilience.configure(attempts=args.retries)
+    if args.archive_dir:
+        archive.configure(args.archive_dir)
+    if args.egress:
+        egress.load_config(args.egress)
+    profile_cache = make_profile_cache(ttl=args.cache_ttl, max_size=args.cache_size, disk_dir=args.cache_dir)
+    BATCH_WORKERS = args.batch_workers
+    DOWNLOAD_AVATARS = args.download_avatars
+    PRINT_REPORTS = args.print_reports
+    background_jobs = BackgroundJobs(workers=args.job_workers, max_pending=args.job_queue_size, name='api-jobs')
+    MAX_BATCH_SIZE = args.max_batch_size
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    if args.async_mode:
+        import sys
+        # async_api imports this module as `api`; reuse this copy instead of loading a second one
+        sys.modules['api'] = sys.modules[__name__]
+        import async_api
+        async_api.serve(args)
+    else:
+        configure_service(args)
+        app.run(host=args.host, port=args.port, debug=True)
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+
+# gzip, hashlib and argparse are imported where used so that importing the
+# scrapers (which only call record_response) stays cheap while archiving is off
+
+class ResponseArchive:
+    """Compressed, content-addressed store of raw upstream responses.
+
+    Payloads are gzip'd under objects/<sha256[:2]>/<sha256>.gz, so identical
+    responses are stored once, and every capture appends a line to index.jsonl.
+    Writes happen on a background thread so the request path only enqueues.
+    """
+
+    def __init__(self, directory, max_pending=1000):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self.stored = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._index_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name='response-archive', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def record(self, platform, kind, key, url, body, status=200):
+        """Queue a raw response body (bytes or str) for archiving without blocking"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        entry = {
+            'stored_at': time.time(),
+            'platform': platform,
+            'kind': kind,
+            'key': key,
+            'url': url,
+            'status': status
+        }
+        try:
+            self._queue.put_nowait((entry, body))
+        except queue.Full:
+            # Never slow the scraper down for the archive
+            self.dropped += 1
+
+    def flush(self):
+        """Block until every queued response has been written"""
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            entry, body = self._queue.get()
+            try:
+                self._write(entry, body)
+            except OSError as e:
+                print(f"Error archiving response for {entry['key']}: {e}", file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry, body):
+        import gzip
+        import hashlib
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            self.deduplicated += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Other processes may write the same blob at the same time, so each writer has its own temp file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+                self.stored += 1
+            except OSError:
+                if not os.path.exists(path):
+                    raise
+                # Another writer stored the same content first
+                self.deduplicated += 1
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        entry['sha256'] = digest
+        entry['size'] = len(body)
+        with self._index_lock, open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest + '.gz')
+
+    def entries(self, platform=None, kind=None, key=None):
+        """Iterate index entries, optionally filtered by platform, kind and key"""
+        try:
+            f = open(self.index_path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                entry = json.loads(line)
+                if platform and entry['platform'] != platform:
+                    continue
+                if kind and entry['kind'] != kind:
+                    continue
+                if key and entry['key'] != key:
+                    continue
+                yield entry
+
+    def load(self, digest):
+        """Return the raw bytes stored under a sha256 digest"""
+        import gzip
+        with gzip.open(self._object_path(digest), 'rb') as f:
+            return f.read()
+
+    def latest(self, platform, kind, key):
+        """Return the most recent index entry for an account, or None"""
+        latest = None
+        for entry in self.entries(platform, kind, key):
+            latest = entry
+        return latest
+
+    def replay(self, entry):
+        """Run a stored response back through the matching parser and return its result"""
+        body = self.load(entry['sha256'])
+        if entry['platform'] == 'tiktok' and entry['kind'] == 'page':
+            from TikTok import parse_user_info
+            return parse_user_info(body.decode('utf-8'))
+        if entry['platform'] == 'instagram':
+            from Instagram import InstagramScraper
+            scraper = InstagramScraper()
+            profile_data = scraper._default_profile_data(entry['key'])
+            if entry['kind'] == 'api':
+                return scraper._parse_api_data(json.loads(body), profile_data)
+            if entry['kind'] == 'web':
+                web_data = scraper._extract_web_data(body.decode('utf-8'))
+                return scraper._parse_web_data(web_data, profile_data) if web_data else profile_data
+        raise ValueError(f"No parser for {entry['platform']}/{entry['kind']} responses")
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+def configure(directory):
+    """Enable archiving to a directory (or disable it with None) for this process"""
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is not None:
+            _default_archive.flush()
+        _default_archive = ResponseArchive(directory) if directory else None
+    return _default_archive
+
+def get_archive():
+    """Return the process-wide archive, enabled by SCRAPER_ARCHIVE_DIR, or None when off"""
+    global _default_archive
+    if _default_archive is None and os.environ.get('SCRAPER_ARCHIVE_DIR'):
+        with _default_archive_lock:
+            if _default_archive is None:
+                _default_archive = ResponseArchive(os.environ['SCRAPER_ARCHIVE_DIR'])
+    return _default_archive
+
+def record_response(platform, kind, key, url, body, status=200):
+    """Archive a response if archiving is enabled; a no-op otherwise"""
+    response_archive = get_archive()
+    if response_archive is not None:
+        response_archive.record(platform, kind, key, url, body, status)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect and replay archived raw responses")
+    parser.add_argument("directory", help="Archive directory")
+    parser.add_argument("command", choices=["list", "replay"], help="List index entries or replay the latest matching response")
+    parser.add_argument("--platform", choices=["tiktok", "instagram"], help="Filter by platform")
+    parser.add_argument("--kind", help="Filter by response kind (page, api, web)")
+    parser.add_argument("--key", help="Filter by username/identifier")
+    args = parser.parse_args()
+
+    response_archive = ResponseArchive(args.directory)
+    entries = list(response_archive.entries(args.platform, args.kind, args.key))
+    if args.command == "list":
+        for entry in entries:
+            print(json.dumps(entry, ensure_ascii=False))
+    elif not entries:
+        print("No matching archived response.")
+        sys.exit(1)
+    else:
+        result = response_archive.replay(entries[-1])
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""Async serving mode for api.py, built on aiohttp.
+
+Lookups are awaited on non-blocking upstream requests, so one process keeps
+thousands of slow scrapes in flight; only page parsing runs on a small thread
+pool. Routes, caching, metrics and response shapes are shared with api.py.
+Start it with `python3 api.py --async [--workers N]`.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    aiohttp = web = None
+
+import api
+import egress
+import metrics
+import rate_limit
+import resilience
+
+def _require_aiohttp():
+    if aiohttp is None:
+        print("The async serving mode needs aiohttp: pip3 install aiohttp", file=sys.stderr)
+        sys.exit(1)
+
+async def _send(session, host, url, headers, proxy=None):
+    start = time.perf_counter()
+    try:
+        with metrics.UPSTREAM_IN_FLIGHT.track_inprogress(host=host):
+            response = await session.get(url, headers=headers, proxy=proxy)
+    except BaseException:
+        metrics.UPSTREAM_RESPONSES.inc(host=host, status='error')
+        raise
+    finally:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, host=host)
+    metrics.UPSTREAM_RESPONSES.inc(host=host, status=response.status)
+    async with response:
+        return response.status, response.headers, await response.read()
+
+def _is_transient(error):
+    # A proxy refusing the tunnel is worth retrying through another endpoint, like requests' ProxyError
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError, asyncio.TimeoutError,
+                              aiohttp.ClientHttpProxyError))
+
+def _is_proxy_error(error):
+    return isinstance(error, (aiohttp.ClientProxyConnectionError, aiohttp.ClientHttpProxyError))
+
+async def fetch(session, url, headers, rate_limited=False):
+    """GET a URL and return (status, headers, body bytes), with the same retries, circuit breaker,
+    egress endpoints and metrics as http_client.get"""
+    attempts = resilience.RequestAttempts(url, rate_limited)
+    while True:
+        wait = attempts.begin()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        endpoint = attempts.endpoint
+        try:
+            if endpoint is None:
+                status, response_headers, body = await _send(session, attempts.host, url, headers)
+            else:
+                status, response_headers, body = await _send(session, attempts.host, url,
+                                                             _headers(dict(headers, **endpoint.headers)), endpoint.proxy)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Like http_client.get, only connection failures and timeouts are retried
+            if not _is_transient(e):
+                raise
+            delay = attempts.on_error(_is_proxy_error(e))
+            if delay is None:
+                raise
+        else:
+            delay = attempts.on_response(status, response_headers)
+            if delay is None:
+                return status, response_headers, body
+        await asyncio.sleep(delay)
+
+def _headers(headers):
+    # aiohttp only decodes brotli with an extra package, so don't advertise it
+    return dict(headers, **{'Accept-Encoding': 'gzip, deflate'})
+
+class AsyncScrapers:
+    """Non-blocking versions of TikTok.fetch_user_record and Instagram.fetch_record"""
+
+    def __init__(self, parse_workers=4, connections_per_host=0):
+        self.connections_per_host = connections_per_host
+        self.parse_executor = ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix='parse')
+        self.session = None
+        self.instagram = api.Instagram.InstagramScraper(verbose=False)
+
+    async def start(self):
+        connect_timeout, read_timeout = api.http_client.settings['timeout']
+        self.session = aiohttp.ClientSession(
+            # Unlike the requests pool this caps concurrent requests, so by default only the rate limiters do
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.connections_per_host),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        self.parse_executor.shutdown(wait=False)
+
+    async def _parse(self, platform, fn, *args):
+        """Run a CPU-bound parser on the thread pool, timed as the platform's parse stage"""
+        def parse():
+            with metrics.stage(platform, 'parse'):
+                return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parse)
+
+    async def fetch_tiktok_record(self, identifier):
+        """Fetch and parse a TikTok profile page; None for unknown accounts, UpstreamError for other failures"""
+        TikTok = api.TikTok
+        url = TikTok.profile_url(identifier)
+        try:
+            with metrics.stage('tiktok', 'fetch'):
+                status, headers, body = await fetch(self.session, url, _headers(TikTok.REQUEST_HEADERS))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise resilience.UpstreamError(f"Error fetching profile: {e!r}", "www.tiktok.com") from e
+        try:
+            resilience.raise_for_status(status, headers, url)
+        except resilience.NotFound:
+            return None
+        api.archive.record_response('tiktok', 'page', identifier.lstrip('@'), url, body, status)
+        # parse_user_record times its own parse stage
+        html_content = body.decode('utf-8', errors='replace')
+        record = await asyncio.get_running_loop().run_in_executor(
+            self.parse_executor, TikTok.parse_user_record, html_content)
+        try:
+            return TikTok.check_record(record, html_content)
+        except resilience.NotFound:
+            return None
+
+    async def fetch_instagram_record(self, username):
+        """Fetch an Instagram profile from the API, then the web page, classifying failures like Instagram.fetch_record"""
+        scraper = self.instagram
+        error = record = None
+        url = scraper.api_url.format(username)
+        try:
+            with metrics.stage('instagram', 'fetch'):
+                status, headers, body = await fetch(self.session, url, _headers(scraper._api_headers()), rate_limited=True)
+            resilience.raise_for_status(status, headers, url)
+            api.archive.record_response('instagram', 'api', username, url, body, status)
+            data = json.loads(body)
+            if 'data' in data and 'user' in data['data']:
+                record = await self._parse('instagram', scraper._record_from_user, data['data']['user'], username, "API")
+        except resilience.NotFound:
+            return None
+        except resilience.UpstreamError as e:
+            error = e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = resilience.UpstreamError(f"Error fetching from API: {e!r}", "i.instagram.com")
+        except ValueError as e:
+            error = resilience.ParseFailure(f"Error decoding API response: {e}", "i.instagram.com")
+        if record is not None:
+            return scraper._checked(record, strict=True)
+
+        url = scraper.backup_url.format(username)
+        try:
+            with metrics.stage('instagram', 'fetch'):
+                status, headers, body = await fetch(self.session, url, _headers(scraper.headers), rate_limited=True)
+            resilience.raise_for_status(status, headers, url)
+            api.archive.record_response('instagram', 'web', username, url, body, status)
+            record = await self._parse('instagram', self._parse_web_page, body.decode('utf-8', errors='replace'), username)
+        except resilience.NotFound:
+            return None
+        except resilience.UpstreamError as e:
+            error = e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = resilience.UpstreamError(f"Error fetching from web: {e!r}", "www.instagram.com")
+        except ValueError as e:
+            error = resilience.ParseFailure(f"Error decoding web response: {e}", "www.instagram.com")
+        if record is not None:
+            return scraper._checked(record, strict=True)
+        raise error or resilience.ParseFailure(f"No profile data found for {username}", "www.instagram.com")
+
+    def _parse_web_page(self, html, username):
+        web_data = self.instagram._extract_web_data(html)
+        user = self.instagram._find_web_user(web_data) if web_data else None
+        return self.instagram._record_from_user(user, username, "web") if user else None
+
+SCRAPERS = web.AppKey('scrapers', AsyncScrapers) if web is not None else 'scrapers'
+BATCH_LIMIT = web.AppKey('batch_limit', asyncio.Semaphore) if web is not None else 'batch_limit'
+
+async def lookup_tiktok(scrapers, identifier, format_info=api.format_tiktok_user_info):
+    """Return (payload, status_code) for one TikTok identifier"""
+    async def fetch_record():
+        record = await scrapers.fetch_tiktok_record(identifier)
+        if record:
+            api.schedule_tiktok_stages(record)
+        return record
+    try:
+        record = await api.profile_cache.get_or_fetch_async('tiktok', identifier, fetch_record)
+        if record:
+            result = format_info(record.to_tiktok_info(), identifier), 200
+        else:
+            result = {"error": "User not found or unable to fetch profile"}, 404
+    except resilience.UpstreamError as e:
+        result = api.error_result(e)
+    except Exception as e:
+        result = {"error": str(e)}, 500
+    api.API_LOOKUPS.inc(platform='tiktok', status=result[1])
+    return result
+
+async def lookup_instagram(scrapers, username):
+    """Return (payload, status_code) for one Instagram username"""
+    async def fetch_record():
+        record = await scrapers.fetch_instagram_record(username)
+        if record:
+            api.schedule_instagram_stages(record)
+        return record
+    try:
+        record = await api.profile_cache.get_or_fetch_async('instagram', username, fetch_record)
+        if record:
+            result = api.format_instagram_user_info(record.to_instagram_profile(), username), 200
+        else:
+            result = {"error": "User not found or unable to fetch profile"}, 404
+    except resilience.UpstreamError as e:
+        result = api.error_result(e)
+    except Exception as e:
+        result = {"error": str(e)}, 500
+    api.API_LOOKUPS.inc(platform='instagram', status=result[1])
+    return result
+
+def json_response(platform, payload, status):
+    """Serialize a payload, timed as the platform's serialize stage"""
+    with metrics.stage(platform, 'serialize'):
+        response = web.json_response(payload, status=status)
+    if 'retry_after' in payload:
+        response.headers['Retry-After'] = str(int(payload['retry_after'] + 0.999))
+    return response
+
+async def get_tiktok_user_info(request):
+    payload, status = await lookup_tiktok(request.app[SCRAPERS], request.match_info['identifier'])
+    return json_response('tiktok', payload, status)
+
+async def get_tiktok_engagement_rate(request):
+    payload, status = await lookup_tiktok(request.app[SCRAPERS], request.match_info['identifier'],
+                                          format_info=api.format_tiktok_engagement)
+    return json_response('tiktok', payload, status)
+
+async def get_instagram_user_info(request):
+    payload, status = await lookup_instagram(request.app[SCRAPERS], request.match_info['username'])
+    return json_response('instagram', payload, status)
+
+async def run_batch_lookup(lookup, scrapers, identifiers, limit):
+    """Run a batch of lookups at most `limit` at a time, yielding item results as they complete"""
+    async def run(index, identifier):
+        async with limit:
+            payload, status = await lookup(scrapers, identifier)
+        item = {'identifier': identifier, 'status': status}
+        if status == 200:
+            item['data'] = payload
+        else:
+            item['error'] = payload.get('error')
+            if 'reason' in payload:
+                item['reason'] = payload['reason']
+        return index, item
+
+    tasks = [asyncio.ensure_future(run(index, identifier)) for index, identifier in enumerate(identifiers)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # A disconnected client must not leave its lookups running
+        for task in tasks:
+            task.cancel()
+
+async def batch_response(request, platform, lookup):
+    """Validate a batch request body and return all results, or stream them as NDJSON"""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    body = body if isinstance(body, dict) else {}
+    identifiers = body.get('identifiers')
+    if not isinstance(identifiers, list) or not all(isinstance(i, str) and i.strip() for i in identifiers):
+        return web.json_response({"error": "Request body must contain 'identifiers', a list of non-empty strings"}, status=400)
+    if len(identifiers) > api.MAX_BATCH_SIZE:
+        return web.json_response({"error": f"At most {api.MAX_BATCH_SIZE} identifiers are allowed per batch"}, status=400)
+
+    scrapers = request.app[SCRAPERS]
+    limit = request.app[BATCH_LIMIT]
+    stream = body.get('stream', False) or request.query.get('stream', 'false').lower() == 'true'
+    if stream:
+        # Chunked NDJSON: one line per profile in completion order
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        async for _, item in run_batch_lookup(lookup, scrapers, identifiers, limit):
+            with metrics.stage(platform, 'serialize'):
+                line = json.dumps(item, ensure_ascii=False) + '\n'
+            await response.write(line.encode('utf-8'))
+        await response.write_eof()
+        return response
+
+    results = [None] * len(identifiers)
+    async for index, item in run_batch_lookup(lookup, scrapers, identifiers, limit):
+        results[index] = item
+    return json_response(platform, {'results': results}, 200)
+
+async def get_tiktok_user_info_batch(request):
+    return await batch_response(request, 'tiktok', lookup_tiktok)
+
+async def get_instagram_user_info_batch(request):
+    return await batch_response(request, 'instagram', lookup_instagram)
+
+async def get_cache_stats(request):
+    return web.json_response(api.profile_cache.stats())
+
+async def get_job_stats(request):
+    return web.json_response(api.background_jobs.stats())
+
+async def get_egress_stats(request):
+    return web.json_response(egress.stats())
+
+async def get_metrics(request):
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+if web is not None:
+    @web.middleware
+    async def request_metrics(request, handler):
+        """Record the same request latency and in-flight metrics as the Flask hooks"""
+        start = time.perf_counter()
+        status = 500
+        api.API_IN_FLIGHT.inc()
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            api.API_IN_FLIGHT.dec()
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else 'unmatched'
+            api.API_REQUEST_SECONDS.observe(time.perf_counter() - start, route=API_REQUEST_ROUTES.get(route, route), status=status)
+
+# aiohttp route patterns mapped to the Flask rules, so both modes export the same route labels
+API_REQUEST_ROUTES = {
+    '/tiktok/user_info/{identifier}': '/tiktok/user_info/<identifier>',
+    '/tiktok/engagement_rate/{identifier}': '/tiktok/engagement_rate/<identifier>',
+    '/instagram/user_info/{username}': '/instagram/user_info/<username>'
+}
+
+def create_app(parse_workers=4, connections_per_host=0):
+    """Build the aiohttp application serving the api.py routes"""
+    _require_aiohttp()
+    app = web.Application(middlewares=[request_metrics])
+    app[SCRAPERS] = AsyncScrapers(parse_workers=parse_workers, connections_per_host=connections_per_host)
+
+    async def on_startup(app):
+        app[BATCH_LIMIT] = asyncio.Semaphore(api.BATCH_WORKERS)
+        await app[SCRAPERS].start()
+
+    async def on_cleanup(app):
+        await app[SCRAPERS].close()
+        api.background_jobs.shutdown()
+        store = api.archive.get_archive()
+        if store is not None:
+            store.flush()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/tiktok/user_info/batch', get_tiktok_user_info_batch)
+    app.router.add_post('/instagram/user_info/batch', get_instagram_user_info_batch)
+    app.router.add_get('/tiktok/user_info/{identifier}', get_tiktok_user_info)
+    app.router.add_get('/tiktok/engagement_rate/{identifier}', get_tiktok_engagement_rate)
+    app.router.add_get('/instagram/user_info/{username}', get_instagram_user_info)
+    app.router.add_get('/cache/stats', get_cache_stats)
+    app.router.add_get('/jobs/stats', get_job_stats)
+    app.router.add_get('/egress/stats', get_egress_stats)
+    app.router.add_get('/metrics', get_metrics)
+    return app
+
+def run_worker(args):
+    """Serve in this process until SIGINT/SIGTERM, then drain in-flight requests"""
+    api.configure_service(args)
+    if args.workers > 1:
+        # The workers share this machine's IP and egress endpoints, so they split its per-host rate limits
+        rate_limit.scale(1.0 / args.workers)
+    app = create_app(parse_workers=args.parse_workers, connections_per_host=args.pool_size or 0)
+    web.run_app(app, host=args.host, port=args.port,
+                reuse_port=args.workers > 1, shutdown_timeout=args.shutdown_timeout,
+                print=None if args.workers > 1 else print)
+
+def serve(args):
+    """Run the async server with args.workers processes sharing the listening port"""
+    _require_aiohttp()
+    if args.workers <= 1:
+        run_worker(args)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, args=(args,), name=f'api-worker-{i}')
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker processes (pid {os.getpid()})")
+
+    def forward(signum, frame):
+        # Each worker stops accepting connections and finishes its requests on SIGTERM
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import http_client
+
+CHUNK_SIZE = 64 * 1024
+
+class AvatarStore:
+    """Profile-picture store with conditional requests and content-addressed deduplication.
+
+    Each account's picture is written as <directory>/<platform>/<account>_profile_pic.jpg,
+    hard-linked to a blob under <directory>/.avatars/objects/<sha256>.jpg so
+    identical images are stored once. The ETag/Last-Modified validators and the
+    content hash of every account are kept in .avatars/meta/, keyed by
+    platform and account so same-named TikTok and Instagram handles don't clash.
+    """
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, '.avatars', 'objects')
+        self.meta_dir = os.path.join(directory, '.avatars', 'meta')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.meta_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def account_path(self, platform, account):
+        return os.path.join(self.directory, platform, f"{account}_profile_pic.jpg")
+
+    def _has_copy(self, path, meta):
+        """True if the account file exists and still holds the image the metadata describes"""
+        sha256 = meta.get('sha256')
+        if not sha256 or not os.path.exists(path):
+            return False
+        try:
+            # A hard link to the blob is the same file; a copy has to be hashed
+            if os.path.samefile(path, self._object_path(sha256)):
+                return True
+        except OSError:
+            pass
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest() == sha256
+
+    def _meta_path(self, platform, account):
+        key = f"{platform}:{account}"
+        return os.path.join(self.meta_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest + '.jpg')
+
+    def _load_meta(self, platform, account):
+        try:
+            with open(self._meta_path(platform, account), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, platform, account, meta):
+        path = self._meta_path(platform, account)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def fetch(self, platform, account, url):
+        """Download an account's avatar if it changed.
+
+        Returns one of 'downloaded', 'unchanged' (same content hash, nothing
+        written), 'not_modified' (server answered 304) or 'error'.
+        """
+        meta = self._load_meta(platform, account)
+        path = self.account_path(platform, account)
+        has_copy = self._has_copy(path, meta)
+        headers = {}
+        # Only send validators if the local copy they describe is still on disk unchanged
+        if has_copy:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = http_client.get(url, headers=headers, stream=True)
+        with response:
+            if response.status_code == 304:
+                return 'not_modified'
+            if response.status_code != 200:
+                return 'error'
+
+            # Hash while streaming; small images stay in memory and only new content hits the disk
+            digest = hashlib.sha256()
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024, dir=self.objects_dir) as body:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    body.write(chunk)
+                sha256 = digest.hexdigest()
+
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                if has_copy and meta.get('sha256') == sha256:
+                    self._save_meta(platform, account, dict(meta, url=url, **validators))
+                    return 'unchanged'
+
+                object_path = self._object_path(sha256)
+                with self._lock:
+                    if not os.path.exists(object_path):
+                        body.seek(0)
+                        tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                        with open(tmp_path, 'wb') as f:
+                            shutil.copyfileobj(body, f, CHUNK_SIZE)
+                        os.replace(tmp_path, object_path)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._link(object_path, path)
+        self._save_meta(platform, account, {'url': url, 'sha256': sha256, **validators})
+        return 'downloaded'
+
+    def _link(self, object_path, target):
+        """Point the account file at the shared blob, copying if hard links are unsupported"""
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, target)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_default_store():
+    """Return the store that writes into the current directory"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = AvatarStore('.')
+        return _default_store
@@ -0,0 +1,420 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import sqlite3
+import argparse
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import resilience
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    by_id INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    available_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reason TEXT,
+    error TEXT,
+    result TEXT,
+    finished_at REAL,
+    UNIQUE (platform, identifier, by_id)
+);
+CREATE INDEX IF NOT EXISTS items_state_available ON items (state, available_at);
+CREATE INDEX IF NOT EXISTS items_owner ON items (owner);
+"""
+
+STATES = ('pending', 'leased', 'done', 'failed')
+
+class LeaseQueue:
+    """SQLite work queue shared by worker processes on one machine, or on several over shared storage.
+
+    Items move pending -> leased -> done (or failed). A worker leases items for
+    `lease_seconds` and renews its leases while it works. Finished items are
+    checkpointed with their result, so a restarted run only does what is left.
+    A lease that is not renewed (the worker crashed or hung) expires and the
+    item is handed out again, until it has been leased `max_attempts` times.
+    For pending and leased items, available_at is the time the item may next
+    be leased: 0 for new items, the retry time after a transient failure, or
+    the lease expiry.
+    """
+
+    def __init__(self, path, lease_seconds=300.0, max_attempts=3, shared=False):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Writers from other processes wait for the lock instead of failing with "database is locked"
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        if shared:
+            # WAL relies on memory shared between processes, which hosts on network storage don't have
+            self._conn.execute('PRAGMA journal_mode=DELETE')
+        else:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextlib.contextmanager
+    def _write(self):
+        """Run statements in one transaction that holds the write lock from the start"""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def add(self, items, chunk_size=10000):
+        """Queue (platform, identifier, by_id) items; ones already queued are skipped. Returns the number added"""
+        added = 0
+        chunk = []
+        for platform, identifier, by_id in items:
+            chunk.append((platform, identifier, int(by_id)))
+            if len(chunk) >= chunk_size:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+    def _insert(self, chunk):
+        with self._write() as conn:
+            return conn.executemany('INSERT OR IGNORE INTO items (platform, identifier, by_id) VALUES (?, ?, ?)',
+                                    chunk).rowcount
+
+    def lease(self, owner, count):
+        """Lease up to `count` due items to owner; returns [(id, platform, identifier, by_id, attempt)]"""
+        now = time.time()
+        with self._write() as conn:
+            # Expired leases go back to the queue, unless the item has used up its attempts
+            conn.execute("UPDATE items SET state = 'failed', owner = NULL, reason = 'lease_expired', error = ?, "
+                         "finished_at = ? WHERE state = 'leased' AND available_at <= ? AND attempts >= ?",
+                         (f"Lease expired {self.max_attempts} times", now, now, self.max_attempts))
+            conn.execute("UPDATE items SET state = 'pending', owner = NULL, reason = 'lease_expired' "
+                         "WHERE state = 'leased' AND available_at <= ?", (now,))
+            # An expired item may be what crashed its worker, so hand out at most one per lease;
+            # otherwise it takes the items leased with it down again on every retry
+            rows = conn.execute("SELECT id, platform, identifier, by_id, attempts FROM items "
+                                "WHERE state = 'pending' AND available_at <= ? AND reason = 'lease_expired' "
+                                "ORDER BY available_at LIMIT 1", (now,)).fetchall()
+            rows += conn.execute("SELECT id, platform, identifier, by_id, attempts FROM items "
+                                 "WHERE state = 'pending' AND available_at <= ? AND reason IS NOT 'lease_expired' "
+                                 "ORDER BY available_at LIMIT ?", (now, count - len(rows))).fetchall()
+            conn.executemany("UPDATE items SET state = 'leased', owner = ?, available_at = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", [(owner, now + self.lease_seconds, row[0]) for row in rows])
+        return [(item_id, platform, identifier, bool(by_id), attempts + 1)
+                for item_id, platform, identifier, by_id, attempts in rows]
+
+    def renew(self, owner):
+        """Extend every lease held by owner by lease_seconds"""
+        with self._write() as conn:
+            conn.execute("UPDATE items SET available_at = ? WHERE owner = ? AND state = 'leased'",
+                         (time.time() + self.lease_seconds, owner))
+
+    def checkpoint(self, owner, outcomes):
+        """Store (id, state, reason, error, result, available_at) outcomes in one transaction.
+
+        Final outcomes are kept from whichever worker finishes an item first; a retry
+        is only scheduled while owner still holds the lease. Returns the number of
+        items finished.
+        """
+        now = time.time()
+        final = [(state, reason, error, result, now, item_id)
+                 for item_id, state, reason, error, result, _ in outcomes if state != 'pending']
+        retries = [(available_at, reason, error, item_id, owner)
+                   for item_id, state, reason, error, _, available_at in outcomes if state == 'pending']
+        with self._write() as conn:
+            finished = conn.executemany("UPDATE items SET state = ?, reason = ?, error = ?, result = ?, finished_at = ?, "
+                                        "owner = NULL WHERE id = ? AND state IN ('pending', 'leased')", final).rowcount
+            conn.executemany("UPDATE items SET state = 'pending', available_at = ?, reason = ?, error = ?, owner = NULL "
+                             "WHERE id = ? AND owner = ? AND state = 'leased'", retries)
+        return finished
+
+    def release(self, owner):
+        """Return owner's leased items to the queue without counting the attempt, e.g. on shutdown"""
+        with self._write() as conn:
+            conn.execute("UPDATE items SET state = 'pending', owner = NULL, available_at = 0, "
+                         "attempts = MAX(attempts - 1, 0) WHERE owner = ? AND state = 'leased'", (owner,))
+
+    def retry_failed(self):
+        """Queue failed items, and items whose lease expired, again with fresh attempts; returns how many"""
+        with self._write() as conn:
+            return conn.execute("UPDATE items SET state = 'pending', owner = NULL, available_at = 0, attempts = 0, "
+                                "reason = NULL, error = NULL WHERE state = 'failed' "
+                                "OR (state = 'pending' AND reason = 'lease_expired') "
+                                "OR (state = 'leased' AND available_at <= ?)", (time.time(),)).rowcount
+
+    def next_available(self):
+        """Return when the next unfinished item can be leased, or None if every item is finished"""
+        times = [self._conn.execute('SELECT MIN(available_at) FROM items WHERE state = ?', (state,)).fetchone()[0]
+                 for state in ('pending', 'leased')]
+        times = [at for at in times if at is not None]
+        return min(times) if times else None
+
+    def stats(self):
+        """Return item counts per state and outcome reason"""
+        counts = dict.fromkeys(STATES, 0)
+        reasons = {}
+        for state, reason, count in self._conn.execute('SELECT state, reason, COUNT(*) FROM items GROUP BY state, reason'):
+            counts[state] += count
+            if reason and state in ('done', 'failed'):
+                reasons[reason] = reasons.get(reason, 0) + count
+        counts['total'] = sum(counts.values())
+        counts['reasons'] = reasons
+        return counts
+
+    def export(self, out):
+        """Write one JSON line per finished item, in input order; returns the number written"""
+        written = 0
+        rows = self._conn.execute("SELECT platform, identifier, reason, error, result FROM items "
+                                  "WHERE state IN ('done', 'failed') ORDER BY id")
+        for platform, identifier, reason, error, result in rows:
+            line = {'platform': platform, 'identifier': identifier}
+            if result is not None:
+                line['record'] = json.loads(result)
+            else:
+                line['error'] = error
+                line['reason'] = reason
+            out.write(json.dumps(line, ensure_ascii=False) + '\n')
+            written += 1
+        return written
+
+    def close(self):
+        self._conn.close()
+
+def fetch_item(platform, identifier, by_id):
+    """Fetch one queued account as a ProfileRecord; None for unknown accounts"""
+    if platform == 'tiktok':
+        import TikTok
+        return TikTok.fetch_user_record(identifier, by_id)
+    if platform == 'instagram':
+        import Instagram
+        return Instagram.fetch_record(identifier)
+    raise ValueError(f"Unsupported platform: {platform}")
+
+def _outcome(item, future, max_attempts, retry_delay):
+    """Turn a finished fetch into a checkpoint outcome: done, failed, or pending again for a retry"""
+    item_id, _, _, _, attempt = item
+    try:
+        record = future.result()
+    except (resilience.NotFound, resilience.PrivateAccount) as e:
+        # Answers about the account, not failures: retrying would not change them
+        return item_id, 'done', e.reason, str(e), None, 0.0
+    except Exception as e:
+        reason = getattr(e, 'reason', 'error')
+        if attempt >= max_attempts:
+            return item_id, 'failed', reason, str(e), None, 0.0
+        delay = max(retry_delay * 2 ** (attempt - 1), getattr(e, 'retry_after', None) or 0.0)
+        return item_id, 'pending', reason, str(e), None, time.time() + delay
+    if record is None:
+        return item_id, 'done', 'not_found', "User not found or unable to fetch profile", None, 0.0
+    return item_id, 'done', None, None, json.dumps(record.to_dict(), ensure_ascii=False), 0.0
+
+def run_worker(path, owner, threads=4, lease_seconds=300.0, max_attempts=3, retry_delay=30.0, shared=False,
+               checkpoint_interval=1.0, fetch=None):
+    """Lease, fetch and checkpoint items until none are left; returns the number of items this worker finished"""
+    fetch = fetch or fetch_item
+    batch = threads * 2
+    queue = LeaseQueue(path, lease_seconds, max_attempts, shared)
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='batch')
+    in_flight = {}
+    outcomes = []
+    finished = 0
+    last_checkpoint = last_renewal = idle_until = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            # Keep the threads busy, but don't poll an empty queue on every completion
+            if len(in_flight) < threads and now >= idle_until:
+                wanted = batch - len(in_flight)
+                items = queue.lease(owner, wanted)
+                for item in items:
+                    in_flight[executor.submit(fetch, item[1], item[2], item[3])] = item
+                if len(items) < wanted:
+                    idle_until = now + 1.0
+            if not in_flight:
+                if outcomes:
+                    finished += queue.checkpoint(owner, outcomes)
+                    outcomes = []
+                next_at = queue.next_available()
+                if next_at is None:
+                    break
+                # Items are waiting for a retry or leased by other workers, which may still fail or die
+                time.sleep(min(max(next_at - time.time(), 0.1), 5.0))
+                idle_until = time.monotonic()
+                continue
+            done, _ = wait(in_flight, timeout=checkpoint_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcomes.append(_outcome(in_flight.pop(future), future, max_attempts, retry_delay))
+            now = time.monotonic()
+            # Checkpoint in batches: one transaction per interval instead of one per item
+            if outcomes and (now - last_checkpoint >= checkpoint_interval or len(outcomes) >= batch):
+                finished += queue.checkpoint(owner, outcomes)
+                outcomes = []
+                last_checkpoint = now
+            if now - last_renewal >= lease_seconds / 3:
+                queue.renew(owner)
+                last_renewal = now
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if outcomes:
+            finished += queue.checkpoint(owner, outcomes)
+        queue.release(owner)
+        queue.close()
+    return finished
+
+def _worker_process(path, processes, options, settings):
+    """Entry point of a worker process: apply the CLI settings, then work the queue"""
+    import rate_limit
+    import http_client
+    if settings.get('egress'):
+        import egress
+        egress.load_config(settings['egress'])
+    if processes > 1:
+        # The processes share this machine's IP and egress endpoints, so they split its per-host rate limits
+        rate_limit.scale(1.0 / processes)
+    http_client.configure(timeout=settings.get('timeout'),
+                          pool_maxsize=max(options['threads'], http_client.settings['pool_maxsize']))
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        run_worker(path, owner, **options)
+    except KeyboardInterrupt:
+        pass
+
+def run(path, processes=None, threads=4, lease_seconds=300.0, max_attempts=3, retry_delay=30.0, shared=False,
+        egress=None, timeout=None, progress_interval=10.0, max_restarts=10):
+    """Work the queue with `processes` worker processes of `threads` threads each until it is drained.
+
+    Crashed workers are restarted after a delay doubling from 1s up to a minute; after
+    `max_restarts` restarts the run is stopped with a RuntimeError.
+    """
+    processes = processes or os.cpu_count() or 1
+    options = {'threads': threads, 'lease_seconds': lease_seconds, 'max_attempts': max_attempts,
+               'retry_delay': retry_delay, 'shared': shared}
+    settings = {'egress': egress, 'timeout': timeout}
+
+    def start_worker(index):
+        worker = multiprocessing.Process(target=_worker_process, args=(path, processes, options, settings),
+                                         name=f'batch-worker-{index}')
+        worker.start()
+        return worker
+
+    def stop_workers():
+        # SIGINT lets the workers checkpoint and release their leases
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGINT)
+        for worker in workers:
+            worker.join()
+
+    workers = [start_worker(index) for index in range(processes)]
+    restarts = 0
+    restart_at = {}
+    started = time.monotonic()
+    next_report = started + progress_interval
+    with LeaseQueue(path, lease_seconds, max_attempts, shared) as queue:
+        try:
+            while restart_at or any(worker.is_alive() for worker in workers):
+                timeout = max(0.0, min([next_report, *restart_at.values()]) - time.monotonic())
+                sentinels = [worker.sentinel for worker in workers if worker.is_alive()]
+                if sentinels:
+                    multiprocessing.connection.wait(sentinels, timeout)
+                else:
+                    time.sleep(timeout)
+                for index, worker in enumerate(workers):
+                    # A crashed worker's leases expire and are retried; replace it while work is left
+                    if worker.exitcode in (None, 0) or index in restart_at or queue.next_available() is None:
+                        continue
+                    restarts += 1
+                    if restarts > max_restarts:
+                        stop_workers()
+                        raise RuntimeError(f"Workers crashed {restarts} times (last exit code {worker.exitcode}); "
+                                           "giving up")
+                    delay = min(60.0, 2.0 ** (restarts - 1))
+                    print(f"{worker.name} exited with code {worker.exitcode}; restarting it in {delay:.0f}s",
+                          file=sys.stderr)
+                    restart_at[index] = time.monotonic() + delay
+                for index, at in list(restart_at.items()):
+                    if time.monotonic() >= at:
+                        del restart_at[index]
+                        workers[index] = start_worker(index)
+                if time.monotonic() >= next_report:
+                    stats = queue.stats()
+                    print(f"{stats['done'] + stats['failed']}/{stats['total']} finished, {stats['leased']} leased, "
+                          f"{stats['failed']} failed ({time.monotonic() - started:.0f}s)", file=sys.stderr, flush=True)
+                    next_report += progress_interval
+        except KeyboardInterrupt:
+            # The workers got the interrupt too; let them checkpoint and release their leases
+            for worker in workers:
+                worker.join()
+        return queue.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch lookups spread over processes and machines through a SQLite lease queue")
+    parser.add_argument("database", help="Queue database file (on shared storage when several machines work it)")
+    parser.add_argument("command", choices=["add", "run", "status", "export", "retry"], help="add items, run workers, show progress, export results, or re-queue failed and expired items")
+    parser.add_argument("input", nargs="?", help="For add: file with one '[platform] identifier' per line, or '-' for stdin")
+    parser.add_argument("--platform", choices=["tiktok", "instagram"], default="tiktok", help="Platform for lines without one (default: tiktok)")
+    parser.add_argument("--output", metavar="FILE", help="For export: write JSON lines to FILE instead of stdout")
+    parser.add_argument("--processes", type=int, help="Worker processes on this machine (default: one per CPU)")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent lookups per process (default: 4)")
+    parser.add_argument("--lease", type=float, default=300, help="Seconds before an unrenewed lease expires and the item is retried (default: 300)")
+    parser.add_argument("--attempts", type=int, default=3, help="Leases per item before it is marked failed (default: 3)")
+    parser.add_argument("--retry-delay", type=float, default=30, help="Base delay in seconds before retrying a failed lookup, doubling per attempt (default: 30)")
+    parser.add_argument("--max-restarts", type=int, default=10, help="Crashed worker restarts before the run is stopped (default: 10)")
+    parser.add_argument("--shared", action="store_true", help="Use a rollback journal so hosts can share the database over network storage")
+    parser.add_argument("--timeout", type=float, help="HTTP connect/read timeout in seconds")
+    parser.add_argument("--egress", metavar="FILE", help="Spread requests over the proxies and header profiles in this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        if not args.input:
+            parser.error("add requires an input file")
+        from scheduler import read_watchlist
+        with LeaseQueue(args.database, args.lease, args.attempts, args.shared) as queue:
+            added = queue.add(read_watchlist(args.input, args.platform))
+            total = queue.stats()['total']
+        print(f"Queued {added} new items ({total} in total)", file=sys.stderr)
+    elif args.command == "run":
+        try:
+            stats = run(args.database, args.processes, args.threads, args.lease, args.attempts, args.retry_delay,
+                        args.shared, args.egress, args.timeout, max_restarts=args.max_restarts)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Batch stopped: {stats['done']} done, {stats['failed']} failed, "
+              f"{stats['pending'] + stats['leased']} left of {stats['total']}", file=sys.stderr)
+    elif args.command == "export":
+        out = sys.stdout if args.output in (None, '-') else open(args.output, 'w', encoding='utf-8')
+        try:
+            with LeaseQueue(args.database, shared=args.shared) as queue:
+                written = queue.export(out)
+                stats = queue.stats()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"Exported {written} results; {stats['pending'] + stats['leased']} items unfinished", file=sys.stderr)
+    elif args.command == "retry":
+        with LeaseQueue(args.database, shared=args.shared) as queue:
+            print(f"Re-queued {queue.retry_failed()} failed or expired items", file=sys.stderr)
+    else:
+        with LeaseQueue(args.database, shared=args.shared) as queue:
+            print(json.dumps(queue.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
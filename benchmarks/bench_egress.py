@@ -0,0 +1,169 @@
+"""Egress pool benchmark against local stand-in proxies.
+
+Starts a local origin server and several forwarding HTTP proxies on
+127.0.0.1 (fast, slow, throttling and dead), then sends requests through
+http_client with the egress pool: first over the direct route only, then over
+the pool. Reports throughput under the per-endpoint rate limit, the share of
+traffic each endpoint got and the pool's health stats:
+
+    python benchmarks/bench_egress.py
+    python benchmarks/bench_egress.py --requests 400 --rate 20 --check
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import http.client
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import egress
+import http_client
+import rate_limit
+import resilience
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """Stand-in upstream: echoes which proxy and User-Agent a request arrived with"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = f"{self.headers.get('X-Forwarded-By', 'direct')}|{self.headers.get('User-Agent', '')}".encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def proxy_handler(name, latency=0.0, throttle=0.0, dead=False):
+    """Build a forwarding proxy handler that adds latency, answers 429 at a rate, or fails every request"""
+    class ProxyHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if dead:
+                self.send_response(502)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(latency)
+            if random.random() < throttle:
+                self.send_response(429)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            # Requests to an HTTP proxy carry the absolute URL
+            target = urllib.parse.urlsplit(self.path)
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+            headers = {key: value for key, value in self.headers.items() if key.lower() not in ('proxy-connection', 'connection')}
+            headers['X-Forwarded-By'] = name
+            connection.request('GET', target.path or '/', headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            connection.close()
+            self.send_response(response.status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    return ProxyHandler
+
+def start_server(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Stand-in proxies: name -> (added latency s, share of 429 answers, always fails)
+PROXIES = {
+    'fast': (0.005, 0.0, False),
+    'slow': (0.08, 0.0, False),
+    'throttled': (0.005, 0.6, False),
+    'dead': (0.0, 0.0, True)
+}
+
+HEADER_PROFILES = {
+    'chrome': {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'},
+    'firefox': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0'}
+}
+
+def run(url, requests_count, workers):
+    """Send requests through http_client; return (seconds, {route: count}, failures)"""
+    routes = {}
+    failures = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        try:
+            response = http_client.get(url, rate_limited=True)
+            route = response.text.split('|')[0] if response.status_code == 200 else f'status {response.status_code}'
+        except Exception as e:
+            route = type(e).__name__
+        with lock:
+            routes[route] = routes.get(route, 0) + 1
+            if not route.startswith(tuple(PROXIES)) and route != 'direct':
+                failures += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, range(requests_count)))
+    return time.perf_counter() - start, routes, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Egress pool benchmark with local stand-in proxies")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per phase (default: 300)")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent requests (default: 16)")
+    parser.add_argument("--rate", type=float, default=50.0, help="Rate limit per endpoint in requests/s (default: 50)")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero unless the pool beats the direct route, favours healthy proxies and quarantines the dead one")
+    args = parser.parse_args()
+
+    origin = start_server(OriginHandler)
+    url = f'http://127.0.0.1:{origin.server_port}/profile'
+    proxies = {name: start_server(proxy_handler(name, *behaviour)) for name, behaviour in PROXIES.items()}
+    resilience.configure(attempts=3, base_delay=0.01, breaker_threshold=1000)
+    rate_limit.configure('127.0.0.1', args.rate, max(1, int(args.rate / 5)))
+    http_client.configure(pool_maxsize=args.workers)
+
+    egress.configure(None)
+    direct_seconds, routes, _ = run(url, args.requests, args.workers)
+    print(f"direct: {args.requests / direct_seconds:7.1f} req/s  {routes}")
+
+    pool = egress.pool_from_config({
+        'endpoints': [{'name': name, 'proxy': f'http://127.0.0.1:{server.server_port}'} for name, server in proxies.items()],
+        'header_profiles': HEADER_PROFILES,
+        'quarantine': 5.0
+    })
+    egress.configure(pool)
+    pool_seconds, routes, failures = run(url, args.requests, args.workers)
+    print(f"pool:   {args.requests / pool_seconds:7.1f} req/s  {routes}  ({failures} failed after retries)")
+
+    print(f"\n{'endpoint':10s} {'requests':>8s} {'failures':>8s} {'success':>8s} {'latency ms':>10s} {'weight':>8s} {'quarantined':>11s}")
+    stats = pool.stats()
+    for name, state in stats.items():
+        latency = f"{state['latency_ms']:.1f}" if state['latency_ms'] is not None else '-'
+        print(f"{name:10s} {state['requests']:8d} {state['failures']:8d} {state['success_rate']:8.2f} {latency:>10s} "
+              f"{state['weight']:8.2f} {state['quarantined_for']:10.1f}s")
+
+    if args.check:
+        problems = []
+        if pool_seconds >= direct_seconds:
+            problems.append("the pool was not faster than the direct route")
+        if not stats['dead']['quarantines']:
+            problems.append("the dead proxy was never quarantined")
+        healthy = stats['fast']['requests'] + stats['slow']['requests']
+        if healthy < 0.8 * sum(state['requests'] for state in stats.values()):
+            problems.append("the healthy proxies got less than 80% of the traffic")
+        for problem in problems:
+            print(f"CHECK FAILED: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
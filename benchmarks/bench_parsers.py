@@ -0,0 +1,210 @@
+"""Offline parser benchmarks driven by stored response fixtures.
+
+Runs the Instagram API/web parsers and the TikTok page extraction against
+stored payloads with no network access, reports per-fixture throughput,
+latency percentiles and peak memory, and can save or compare baselines:
+
+    python benchmarks/bench_parsers.py
+    python benchmarks/bench_parsers.py --save-baseline baseline.json
+    python benchmarks/bench_parsers.py --compare baseline.json --threshold 0.2
+"""
+import os
+import io
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import TikTok
+import archive
+import instagram_stream
+from Instagram import InstagramScraper
+
+def synthetic_tiktok_page(user, padding_blocks=600):
+    """Build a TikTok-like profile page around the bio/counts of an Instagram fixture"""
+    user_detail = {
+        'userInfo': {
+            'user': {
+                'id': str(user.get('id', '0')),
+                'uniqueId': user.get('username', ''),
+                'nickname': user.get('full_name', ''),
+                'avatarLarger': user.get('profile_pic_url_hd', ''),
+                'signature': user.get('biography', ''),
+                'verified': bool(user.get('is_verified')),
+                'secUid': 'MS4wLjABAAAA' + str(user.get('id', '0')),
+                'commentSetting': 0,
+                'privateAccount': bool(user.get('is_private')),
+                'ttSeller': False,
+                'region': 'ID',
+                'bioLink': {'link': user.get('external_url') or '', 'risk': 0}
+            },
+            'stats': {
+                'followerCount': user.get('edge_followed_by', {}).get('count', 0),
+                'followingCount': user.get('edge_follow', {}).get('count', 0),
+                'heart': 123456789,
+                'heartCount': 123456789,
+                'videoCount': user.get('edge_owner_to_timeline_media', {}).get('count', 0),
+                'diggCount': 0,
+                'friendCount': 0
+            }
+        }
+    }
+    scope = {'__DEFAULT_SCOPE__': {'webapp.app-context': {'language': 'en'}, 'webapp.user-detail': user_detail}}
+    blob = json.dumps(scope, separators=(',', ':')).replace('/', '\\u002F')
+    filler = '<div class="css-1 DivItemContainer"><a href="/video/1"><span class="css-2">item</span></a></div>\n'
+    link = (user.get('external_url') or 'https://example.com').split('://')[-1]
+    links = (f'<div class="DivShareLinks"><a href="https://www.tiktok.com/link/v2?scene=bio_url&amp;target='
+             f'https%3A%2F%2F{link}" class="ABioLink"><span class="SpanLink">{link}</span></a></div>')
+    return ('<html><head>' + filler * (padding_blocks // 3)
+            + f'<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">{blob}</script>'
+            + '</head><body>' + filler * padding_blocks + links + filler * (padding_blocks // 3) + '</body></html>')
+
+def load_fixtures(args):
+    """Collect (name, kind, parse function, payload size) tuples"""
+    scraper = InstagramScraper(verbose=False)
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(args.fixtures, '*_api_response.json'))):
+        name = os.path.basename(path)[:-len('_api_response.json')]
+        with open(path, 'rb') as f:
+            raw = f.read()
+        size = len(raw)
+        user = json.loads(raw)['data']['user']
+
+        def parse_api(raw=raw, name=name):
+            return scraper._parse_api_data(json.loads(raw), scraper._default_profile_data(name))
+
+        def parse_web(raw=raw, name=name):
+            web_data = {'graphql': json.loads(raw)['data']}
+            return scraper._parse_web_data(web_data, scraper._default_profile_data(name))
+
+        def parse_stream(raw=raw, name=name):
+            api_data = instagram_stream.parse_profile_stream(io.BytesIO(raw))
+            return scraper._parse_api_data(api_data, scraper._default_profile_data(name))
+
+        page = synthetic_tiktok_page(user)
+
+        def parse_tiktok(page=page):
+            return TikTok.parse_user_info(page)
+
+        fixtures.append((name, 'instagram_api', parse_api, size))
+        fixtures.append((name, 'instagram_web', parse_web, size))
+        if instagram_stream.streaming_available():
+            fixtures.append((name, 'instagram_stream', parse_stream, size))
+        fixtures.append((name, 'tiktok_page', parse_tiktok, len(page.encode('utf-8'))))
+
+    # Real TikTok pages saved to disk, e.g. from the response archive
+    for path in args.tiktok_html:
+        with open(path, encoding='utf-8') as f:
+            page = f.read()
+        fixtures.append((os.path.basename(path), 'tiktok_page', lambda page=page: TikTok.parse_user_info(page),
+                         len(page.encode('utf-8'))))
+    if args.archive:
+        response_archive = archive.ResponseArchive(args.archive)
+        seen = set()
+        for entry in response_archive.entries(platform='tiktok', kind='page'):
+            # The index lists every capture; benchmark each distinct payload once
+            if entry['sha256'] in seen:
+                continue
+            seen.add(entry['sha256'])
+            page = response_archive.load(entry['sha256']).decode('utf-8')
+            fixtures.append((f"archive:{entry['key']}", 'tiktok_page', lambda page=page: TikTok.parse_user_info(page),
+                             entry['size']))
+    return fixtures
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(parse, size, iterations, warmup):
+    """Time parse() and measure its peak traced allocation in a separate run"""
+    for _ in range(warmup):
+        parse()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        parse()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'iterations': iterations,
+        'mean_ms': total / iterations * 1e3,
+        'p50_ms': percentile(timings, 0.50) * 1e3,
+        'p95_ms': percentile(timings, 0.95) * 1e3,
+        'p99_ms': percentile(timings, 0.99) * 1e3,
+        'ops_per_s': iterations / total if total else 0.0,
+        'mb_per_s': size * iterations / total / 1e6 if total else 0.0,
+        'peak_kb': peak / 1024,
+        'payload_kb': size / 1024
+    }
+
+def compare(results, baseline, threshold):
+    """Print p50 deltas against a baseline and return the list of regressions"""
+    regressions = []
+    print(f"\n=== Comparison with baseline ({baseline.get('created', 'unknown')}) ===")
+    for key, current in results.items():
+        previous = baseline['results'].get(key)
+        if not previous:
+            print(f"{key:45s} new")
+            continue
+        change = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] if previous['p50_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print(f"{key:45s} p50 {previous['p50_ms']:8.3f} -> {current['p50_ms']:8.3f} ms ({change:+.1%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline parser benchmarks")
+    parser.add_argument("--fixtures", default=ROOT, help="Directory containing *_api_response.json fixtures")
+    parser.add_argument("--tiktok-html", nargs="*", default=[], help="Captured TikTok profile pages to include")
+    parser.add_argument("--archive", help="Response archive directory whose TikTok pages are included")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed runs per fixture")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed runs per fixture")
+    parser.add_argument("--filter", help="Only run fixtures whose kind or name contains this text")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50 slowdown before failing (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'fixture':45s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'ops/s':>9s} {'MB/s':>8s} {'peak KB':>9s}")
+    for name, kind, parse, size in load_fixtures(args):
+        key = f"{kind}/{name}"
+        if args.filter and args.filter not in key:
+            continue
+        stats = measure(parse, size, args.iterations, args.warmup)
+        results[key] = stats
+        print(f"{key:45s} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f} {stats['p99_ms']:9.3f} "
+              f"{stats['ops_per_s']:9.1f} {stats['mb_per_s']:8.1f} {stats['peak_kb']:9.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'results': results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Cold-start benchmark for the scraper entry points.
+
+Imports each entry module in a fresh interpreter with -X importtime, reports
+the median cumulative import time and process wall time, lists the slowest
+imports, and can save or compare baselines:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --save-baseline startup.json
+    python benchmarks/bench_startup.py --compare startup.json --threshold 0.25
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry modules whose import must stay cheap; 'python' is the bare interpreter for reference
+TARGETS = ['TikTok', 'Instagram', 'api']
+
+def run_import(module, env):
+    """Import a module in a new interpreter; return (wall seconds, {module: (self us, cumulative us)})"""
+    code = 'pass' if module == 'python' else f'import {module}'
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    imports = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall, imports
+
+def measure(module, runs, env):
+    """Median cumulative import time and wall time over several cold interpreters"""
+    walls = []
+    import_times = []
+    slowest = {}
+    for _ in range(runs):
+        wall, imports = run_import(module, env)
+        walls.append(wall)
+        import_times.append(imports.get(module, (0, 0))[1] / 1e3)
+        for name, (self_us, _) in imports.items():
+            slowest.setdefault(name, []).append(self_us / 1e3)
+    return {
+        'runs': runs,
+        'import_ms': statistics.median(import_times),
+        'wall_ms': statistics.median(walls) * 1e3,
+        'slowest': sorted(((name, statistics.median(times)) for name, times in slowest.items()),
+                          key=lambda item: -item[1])
+    }
+
+def compare(results, baseline, threshold):
+    """Print import-time deltas against a baseline and return the list of regressions"""
+    regressions = []
+    print(f"\n=== Comparison with baseline ({baseline.get('created', 'unknown')}) ===")
+    for module, current in results.items():
+        previous = baseline['results'].get(module)
+        if not previous:
+            print(f"{module:12s} new")
+            continue
+        change = (current['import_ms'] - previous['import_ms']) / previous['import_ms'] if previous['import_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(module)
+        print(f"{module:12s} import {previous['import_ms']:8.1f} -> {current['import_ms']:8.1f} ms ({change:+.1%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--modules", nargs="*", default=TARGETS, help="Entry modules to import (default: %(default)s)")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters per module (default: 7)")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports listed per module (default: 8)")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed import-time slowdown before failing (default: 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # Measure with warm bytecode caches, as a deployed worker would start
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    for module in args.modules:
+        run_import(module, env)
+
+    bare = measure('python', args.runs, env)
+    # Modules the interpreter loads on its own (site, .pth hooks) are not the entry points' fault
+    preloaded = {name for name, _ in bare['slowest']}
+    print(f"bare interpreter: {bare['wall_ms']:.1f} ms wall\n")
+    print(f"{'module':12s} {'import ms':>10s} {'wall ms':>9s}  slowest imports (self ms)")
+    results = {}
+    for module in args.modules:
+        stats = measure(module, args.runs, env)
+        slowest = [(name, ms) for name, ms in stats.pop('slowest') if name not in preloaded]
+        slowest = ', '.join(f"{name} {ms:.1f}" for name, ms in slowest[:args.top])
+        results[module] = stats
+        print(f"{module:12s} {stats['import_ms']:10.1f} {stats['wall_ms']:9.1f}  {slowest}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'results': results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
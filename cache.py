@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class _Call:
+    """A single in-flight fetch that concurrent callers wait on"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers share its result or exception"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Return how many fetches ran and how many callers were coalesced onto them"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls)
+            }
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for coroutine fetches on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Await fn() once per key at a time; concurrent callers share its result or exception"""
+        import asyncio
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The fetch runs as its own task, so cancelling any caller (the first one included)
+            # leaves it and the other callers alone
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            self.executed += 1
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled
+            task.exception()
+
+    def stats(self):
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls)
+        }
+
+class ProfileCache:
+    """In-process TTL + LRU cache for scraped profiles with an optional on-disk tier"""
+
+    def __init__(self, ttl=300, max_size=1024, disk_dir=None, serialize=None, deserialize=None):
+        self.ttl = ttl
+        # Converters between cached values and JSON for the disk tier
+        self.serialize = serialize or (lambda value: value)
+        self.deserialize = deserialize or (lambda value: value)
+        self.max_size = max_size
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (stored_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.flight = SingleFlight()
+        self.async_flight = AsyncSingleFlight()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(platform, identifier):
+        """Build the cache key from the platform and a normalized identifier"""
+        identifier = identifier.strip()
+        if identifier.startswith('@'):
+            identifier = identifier[1:]
+        return f"{platform}:{identifier.lower()}"
+
+    def get(self, platform, identifier):
+        """Return the cached profile, or None if it is missing or expired"""
+        key = self.make_key(platform, identifier)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        # Fall back to the disk tier and promote fresh entries to memory
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is not None and now - entry[0] < self.ttl:
+                self._store(key, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def set(self, platform, identifier, value):
+        """Store a profile in memory and, if enabled, on disk"""
+        key = self.make_key(platform, identifier)
+        entry = (time.time(), value)
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def get_or_fetch(self, platform, identifier, fetch):
+        """Return the cached profile or call fetch() and cache a non-empty result.
+
+        Concurrent misses for the same key wait on a single shared fetch.
+        """
+        value = self.get(platform, identifier)
+        if value is None:
+            value = self.flight.do(self.make_key(platform, identifier),
+                                   lambda: self._fetch_and_store(platform, identifier, fetch))
+        return value
+
+    async def get_or_fetch_async(self, platform, identifier, fetch):
+        """Like get_or_fetch() for a coroutine function, coalescing concurrent misses on the event loop"""
+        value = self.get(platform, identifier)
+        if value is None:
+            value = await self.async_flight.do(self.make_key(platform, identifier),
+                                               lambda: self._fetch_and_store_async(platform, identifier, fetch))
+        return value
+
+    async def _fetch_and_store_async(self, platform, identifier, fetch):
+        value = await fetch()
+        if value:
+            self.set(platform, identifier, value)
+        return value
+
+    def _fetch_and_store(self, platform, identifier, fetch):
+        value = fetch()
+        if value:
+            self.set(platform, identifier, value)
+        return value
+
+    def clear(self):
+        """Drop every in-memory entry (the disk tier is left untouched)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters, the current size and request coalescing counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'fetches': self.flight.stats(),
+                'async_fetches': self.async_flight.stats()
+            }
+
+    def _store(self, key, entry):
+        # Caller holds the lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), encoding='utf-8') as f:
+                stored = json.load(f)
+            return stored['stored_at'], self.deserialize(stored['value'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        # Worker processes share disk_dir, so the temp name needs the pid as well as the thread
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'stored_at': entry[0], 'value': self.serialize(entry[1])}, f, ensure_ascii=False)
+            # Atomic replace so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing cache entry {key}: {e}")
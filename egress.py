@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import random
+import threading
+
+import metrics
+
+# Response statuses that count against an endpoint: throttling, blocking and proxy/server failures
+UNHEALTHY_STATUSES = frozenset((403, 407, 429, 500, 502, 503, 504))
+
+class Endpoint:
+    """One egress route (a proxy, or the direct connection) with its header profile and health"""
+
+    __slots__ = ('name', 'proxy', 'headers', 'success_rate', 'latency', 'requests', 'failures',
+                 'consecutive_failures', 'quarantined_until', 'quarantines', 'quarantine_level')
+
+    def __init__(self, name, proxy=None, headers=None):
+        self.name = name
+        self.proxy = proxy
+        self.headers = dict(headers or {})
+        # Exponentially weighted success share and latency (seconds) of recent requests
+        self.success_rate = 1.0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0
+        self.quarantines = 0
+        self.quarantine_level = 0
+
+    def __repr__(self):
+        return f"Endpoint({self.name!r})"
+
+    def request_kwargs(self, kwargs):
+        """Return requests.get() kwargs routed through this endpoint, with its headers over the caller's"""
+        kwargs = dict(kwargs)
+        if self.headers:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **self.headers)
+        if self.proxy:
+            kwargs['proxies'] = {'http': self.proxy, 'https': self.proxy}
+        return kwargs
+
+class EgressPool:
+    """Spreads upstream requests over endpoints, weighted by recent success rate and latency.
+
+    An endpoint is picked at random with weight success_rate**2 / (latency +
+    expected wait), so a fast, healthy route gets most of the traffic while
+    slower ones still get enough to keep their numbers current. After `failure_threshold` failures in
+    a row, or a success rate below `min_success`, an endpoint is quarantined for
+    `quarantine` seconds, doubling on each repeat up to `max_quarantine`.
+    """
+
+    def __init__(self, endpoints, alpha=0.2, failure_threshold=3, min_success=0.3,
+                 quarantine=30.0, max_quarantine=600.0):
+        if not endpoints:
+            raise ValueError("An egress pool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.min_success = min_success
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self._lock = threading.Lock()
+
+    def _weight(self, endpoint, default_latency, wait=0.0):
+        # Caller holds the lock
+        latency = endpoint.latency if endpoint.latency is not None else default_latency
+        return max(endpoint.success_rate, 0.01) ** 2 / max(latency + wait, 0.01)
+
+    def choose(self, expected_wait=None):
+        """Pick an endpoint for the next request; if all are quarantined, the one released soonest.
+
+        expected_wait(endpoint), if given, returns how long the caller would queue (e.g. for a
+        rate limiter token) before sending through that endpoint; it is added to the latency.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = []
+            for endpoint in self.endpoints:
+                if endpoint.quarantined_until and now >= endpoint.quarantined_until:
+                    # Back on probation: forget the failures that got it quarantined
+                    endpoint.quarantined_until = 0.0
+                    endpoint.consecutive_failures = 0
+                    endpoint.success_rate = max(endpoint.success_rate, 0.5)
+                if not endpoint.quarantined_until:
+                    available.append(endpoint)
+            if not available:
+                return min(self.endpoints, key=lambda endpoint: endpoint.quarantined_until)
+            # Endpoints without latency samples yet compete with the average of the measured ones
+            measured = [endpoint.latency for endpoint in available if endpoint.latency is not None]
+            default_latency = sum(measured) / len(measured) if measured else 1.0
+            weights = [self._weight(endpoint, default_latency, expected_wait(endpoint) if expected_wait else 0.0)
+                       for endpoint in available]
+        return random.choices(available, weights)[0]
+
+    def record(self, endpoint, ok, latency):
+        """Update an endpoint's health after a request; ok is False for errors and UNHEALTHY_STATUSES"""
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.success_rate += self.alpha * ((1.0 if ok else 0.0) - endpoint.success_rate)
+            if ok:
+                endpoint.latency = latency if endpoint.latency is None else endpoint.latency + self.alpha * (latency - endpoint.latency)
+                endpoint.consecutive_failures = 0
+                endpoint.quarantine_level = 0
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.quarantined_until:
+                return
+            if endpoint.consecutive_failures >= self.failure_threshold or endpoint.success_rate < self.min_success:
+                duration = min(self.max_quarantine, self.quarantine * 2 ** endpoint.quarantine_level)
+                endpoint.quarantined_until = time.monotonic() + duration
+                endpoint.quarantine_level += 1
+                endpoint.quarantines += 1
+
+    def stats(self):
+        """Return per-endpoint traffic, health, selection weight and quarantine state"""
+        now = time.monotonic()
+        with self._lock:
+            measured = [endpoint.latency for endpoint in self.endpoints if endpoint.latency is not None]
+            default_latency = sum(measured) / len(measured) if measured else 1.0
+            return {
+                endpoint.name: {
+                    'requests': endpoint.requests,
+                    'failures': endpoint.failures,
+                    'success_rate': round(endpoint.success_rate, 3),
+                    'latency_ms': round(endpoint.latency * 1e3, 1) if endpoint.latency is not None else None,
+                    'weight': round(self._weight(endpoint, default_latency), 3),
+                    'quarantined_for': round(max(0.0, endpoint.quarantined_until - now), 1) if endpoint.quarantined_until else 0.0,
+                    'quarantines': endpoint.quarantines
+                }
+                for endpoint in self.endpoints
+            }
+
+def pool_from_config(config):
+    """Build a pool from a config dict; see load_config() for the format"""
+    profiles = config.get('header_profiles') or {}
+    if isinstance(profiles, list):
+        profiles = {str(index): profile for index, profile in enumerate(profiles)}
+    profile_names = list(profiles)
+    endpoints = []
+    for index, entry in enumerate(config.get('endpoints') or [{'name': 'direct'}]):
+        headers = entry.get('headers')
+        if isinstance(headers, str):
+            headers = profiles[headers]
+        elif headers is None and profile_names:
+            # Endpoints without their own profile take the profiles in turn
+            headers = profiles[profile_names[index % len(profile_names)]]
+        # Names label the stats and metrics, so never fall back to the proxy URL and its credentials
+        name = entry.get('name') or ('direct' if not entry.get('proxy') else f'endpoint-{index}')
+        endpoints.append(Endpoint(name, entry.get('proxy'), headers))
+    options = {key: config[key] for key in ('alpha', 'failure_threshold', 'min_success', 'quarantine', 'max_quarantine')
+               if key in config}
+    return EgressPool(endpoints, **options)
+
+_pool = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+def configure(pool):
+    """Route upstream requests through an EgressPool, or directly again with None"""
+    global _pool, _pool_loaded
+    with _pool_lock:
+        _pool = pool
+        _pool_loaded = True
+
+def load_config(path):
+    """Configure the pool from a JSON file:
+
+        {"endpoints": [{"name": "direct"}, {"name": "a", "proxy": "http://10.0.0.2:3128", "headers": "firefox"}],
+         "header_profiles": {"chrome": {"User-Agent": "..."}, "firefox": {"User-Agent": "..."}},
+         "quarantine": 30}
+    """
+    with open(path, encoding='utf-8') as f:
+        pool = pool_from_config(json.load(f))
+    configure(pool)
+    return pool
+
+def get_pool():
+    """Return the configured pool (loading EGRESS_CONFIG on first use), or None for direct requests"""
+    global _pool, _pool_loaded
+    if not _pool_loaded:
+        with _pool_lock:
+            if not _pool_loaded:
+                path = os.environ.get('EGRESS_CONFIG')
+                if path:
+                    with open(path, encoding='utf-8') as f:
+                        _pool = pool_from_config(json.load(f))
+                _pool_loaded = True
+    return _pool
+
+def stats():
+    """Return per-endpoint stats of the configured pool, or {} without one"""
+    pool = get_pool()
+    return pool.stats() if pool is not None else {}
+
+def collect_metrics():
+    endpoints = stats()
+    return [
+        ('egress_requests_total', 'counter', 'Upstream requests per egress endpoint by outcome',
+         [({'endpoint': name, 'outcome': 'success'}, state['requests'] - state['failures']) for name, state in endpoints.items()] +
+         [({'endpoint': name, 'outcome': 'failure'}, state['failures']) for name, state in endpoints.items()]),
+        ('egress_endpoint_success_ratio', 'gauge', 'Recent success share per egress endpoint',
+         [({'endpoint': name}, state['success_rate']) for name, state in endpoints.items()]),
+        ('egress_endpoint_quarantined', 'gauge', 'Whether an egress endpoint is quarantined (1) or in rotation (0)',
+         [({'endpoint': name}, 1 if state['quarantined_for'] else 0) for name, state in endpoints.items()])
+    ]
+
+metrics.REGISTRY.add_collector(collect_metrics)
@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+
+import metrics
+import resilience
+
+# requests (and urllib3, ssl, http.client, ...) is imported when the first session is built
+
+# Pool and timeout settings, overridable through the environment or configure()
+settings = {
+    # Number of per-host connection pools kept alive
+    'pool_connections': int(os.environ.get('SCRAPER_POOL_CONNECTIONS', 10)),
+    # Maximum number of kept-alive connections per host
+    'pool_maxsize': int(os.environ.get('SCRAPER_POOL_MAXSIZE', 32)),
+    # (connect, read) timeout in seconds applied to every request
+    'timeout': (
+        float(os.environ.get('SCRAPER_CONNECT_TIMEOUT', 5)),
+        float(os.environ.get('SCRAPER_READ_TIMEOUT', 20))
+    )
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session():
+    """Create a session whose adapters keep a connection pool per host"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings['pool_connections'],
+        pool_maxsize=settings['pool_maxsize'],
+        # Block instead of opening throwaway connections when a host pool is exhausted
+        pool_block=True
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def configure(pool_connections=None, pool_maxsize=None, timeout=None):
+    """Change the pool sizes and/or default timeout; the shared session is rebuilt lazily"""
+    global _session
+    with _session_lock:
+        if pool_connections is not None:
+            settings['pool_connections'] = pool_connections
+        if pool_maxsize is not None:
+            settings['pool_maxsize'] = pool_maxsize
+        if timeout is not None:
+            # A single number sets both the connect and the read timeout
+            settings['timeout'] = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def _send(session, host, url, kwargs):
+    start = time.perf_counter()
+    try:
+        with metrics.UPSTREAM_IN_FLIGHT.track_inprogress(host=host):
+            response = session.get(url, **kwargs)
+    except Exception:
+        metrics.UPSTREAM_RESPONSES.inc(host=host, status='error')
+        raise
+    finally:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, host=host)
+    metrics.UPSTREAM_RESPONSES.inc(host=host, status=response.status_code)
+    return response
+
+def _is_transient(error):
+    from requests.exceptions import ConnectionError, Timeout
+    return isinstance(error, (ConnectionError, Timeout))
+
+def _is_proxy_error(error):
+    from requests.exceptions import ProxyError
+    return isinstance(error, ProxyError)
+
+def get(url, rate_limited=False, retry=None, **kwargs):
+    """GET through the shared keep-alive session with the default timeout applied.
+
+    Throttled (429), 5xx and connection-failed attempts are retried with the
+    resilience retry policy (or `retry`), and feed the host's circuit breaker,
+    which raises resilience.CircuitOpen instead of sending while the host is
+    failing. With an egress pool configured, each attempt goes out through
+    the endpoint (proxy and header profile) the pool picks. With rate_limited,
+    every attempt first takes a token from the host's (per-endpoint) rate
+    limiter. The last response is returned even if it is an error.
+    """
+    kwargs.setdefault('timeout', settings['timeout'])
+    attempts = resilience.RequestAttempts(url, rate_limited, retry)
+    session = get_session()
+    while True:
+        wait = attempts.begin()
+        if wait > 0:
+            time.sleep(wait)
+        endpoint = attempts.endpoint
+        try:
+            response = _send(session, attempts.host, url, endpoint.request_kwargs(kwargs) if endpoint else kwargs)
+        except Exception as e:
+            if not _is_transient(e):
+                raise
+            delay = attempts.on_error(_is_proxy_error(e))
+            if delay is None:
+                raise
+        else:
+            delay = attempts.on_response(response.status_code, response.headers)
+            if delay is None:
+                return response
+            response.close()
+        time.sleep(delay)
+
+def __getattr__(name):
+    # Lets callers write `except http_client.RequestException` without importing requests up front
+    if name == 'RequestException':
+        from requests.exceptions import RequestException
+        return RequestException
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def close():
+    """Close all pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,81 @@
+import json
+
+# ijson is optional and only imported when a response is first parsed;
+# without it responses are decoded in full with the json module
+_ijson = None
+_ijson_checked = False
+
+USER_PREFIX = 'data.user.'
+EDGES_PREFIX = 'data.user.edge_owner_to_timeline_media.edges.item'
+
+# Scalar fields of data.user that InstagramScraper._parse_api_data reads
+USER_SCALARS = {
+    'full_name', 'biography', 'is_verified', 'is_private', 'profile_pic_url_hd',
+    'category_name', 'is_business_account'
+}
+
+# data.user.<edge>.count values that _parse_api_data reads
+USER_COUNTS = {'edge_followed_by', 'edge_follow', 'edge_owner_to_timeline_media'}
+
+# Per-post counts under edge_owner_to_timeline_media.edges[].node
+NODE_COUNTS = {
+    EDGES_PREFIX + '.node.edge_liked_by.count': 'edge_liked_by',
+    EDGES_PREFIX + '.node.edge_media_to_comment.count': 'edge_media_to_comment'
+}
+
+def _load_ijson():
+    global _ijson, _ijson_checked
+    if not _ijson_checked:
+        try:
+            import ijson
+        except ImportError:
+            ijson = None
+        _ijson, _ijson_checked = ijson, True
+    return _ijson
+
+def streaming_available():
+    """Return True when the incremental ijson parser is installed"""
+    return _load_ijson() is not None
+
+def parse_profile_stream(stream):
+    """Incrementally parse a web_profile_info body, keeping only the fields _parse_api_data uses.
+
+    Returns a trimmed {'data': {'user': {...}}} dict in the same shape as the
+    full response, so the regular parser can consume it unchanged. Thumbnails,
+    captions, display_resources and every other field are never materialized.
+    """
+    ijson = _load_ijson()
+    if ijson is None:
+        return json.load(stream)
+
+    user = {}
+    posts = None
+    node = None
+    try:
+        for prefix, event, value in ijson.parse(stream):
+            if not prefix.startswith(USER_PREFIX):
+                continue
+            if prefix == EDGES_PREFIX:
+                if event == 'start_map':
+                    node = {}
+                elif event == 'end_map':
+                    posts.append({'node': node})
+                    node = None
+                continue
+            if node is not None:
+                field = NODE_COUNTS.get(prefix)
+                if field and event == 'number':
+                    node[field] = {'count': value}
+                continue
+
+            name = prefix[len(USER_PREFIX):]
+            if name in USER_SCALARS and event in ('string', 'boolean', 'number', 'null'):
+                user[name] = value
+            elif name.endswith('.count') and event == 'number' and name[:-len('.count')] in USER_COUNTS:
+                user.setdefault(name[:-len('.count')], {})['count'] = value
+            elif name == 'edge_owner_to_timeline_media.edges' and event == 'start_array':
+                posts = user.setdefault('edge_owner_to_timeline_media', {}).setdefault('edges', [])
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid profile JSON: {e}") from e
+
+    return {'data': {'user': user}} if user else {}
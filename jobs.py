@@ -0,0 +1,59 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class BackgroundJobs:
+    """Bounded background queue for work the caller does not wait on.
+
+    At most max_pending jobs are queued or running; further submissions are
+    dropped (and counted) rather than growing memory or blocking the caller.
+    """
+
+    def __init__(self, workers=2, max_pending=256, name='jobs'):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); return False if the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        self._executor.submit(self._run, fn, args, kwargs)
+        return True
+
+    def _run(self, fn, args, kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Background job {getattr(fn, '__name__', fn)} failed: {e}", file=sys.stderr)
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Return submitted/completed/failed/dropped counters and the current backlog"""
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'pending': self.submitted - self.completed - self.failed,
+                'max_pending': self.max_pending
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
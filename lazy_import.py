@@ -0,0 +1,23 @@
+import importlib
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access.
+
+    Lets entry points name their dependencies at the top of the file without
+    paying their import cost until a code path actually uses them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module serializes concurrent first imports on the import lock
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
@@ -0,0 +1,164 @@
+class ProfileRecord:
+    """Compact typed profile shared by the TikTok and Instagram scrapers.
+
+    Counts are native ints, flags are bools, and anything the upstream page
+    did not provide is None. to_tiktok_info() and to_instagram_profile()
+    produce the string-valued dict shapes the scrapers have always returned.
+    """
+
+    __slots__ = (
+        'platform', 'user_id', 'username', 'full_name', 'biography', 'region',
+        'followers', 'following', 'posts', 'likes', 'heart', 'digg_count', 'friend_count',
+        'is_verified', 'is_private', 'is_professional', 'category', 'sec_uid',
+        'comment_setting', 'profile_pic_url', 'social_links',
+        'average_likes', 'average_comments', 'engagement_rate', 'advanced_engagement_rate'
+    )
+
+    def __init__(self, platform, **values):
+        self.platform = platform
+        for name in self.__slots__[1:]:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"Unknown profile fields: {', '.join(values)}")
+
+    def __repr__(self):
+        return f"ProfileRecord(platform={self.platform!r}, username={self.username!r}, followers={self.followers!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, ProfileRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def to_dict(self):
+        """Return the native (JSON-serializable) field values"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        if values['social_links'] is not None:
+            values['social_links'] = list(values['social_links'])
+        return values
+
+    @classmethod
+    def from_dict(cls, values):
+        """Rebuild a record from to_dict() output"""
+        values = dict(values)
+        if values.get('social_links') is not None:
+            values['social_links'] = tuple(values['social_links'])
+        return cls(values.pop('platform'), **values)
+
+    # ---- TikTok info dict ----
+
+    @classmethod
+    def from_tiktok_info(cls, info):
+        """Build a record from a TikTok get_user_info() dict"""
+        values = {}
+        for key, name, kind in TIKTOK_INFO_FIELDS:
+            values[name] = coerce_value(info.get(key), kind)
+        values['social_links'] = tuple(info.get('social_links') or ())
+        values['engagement_rate'] = info.get('engagement_rate')
+        values['advanced_engagement_rate'] = info.get('advanced_engagement_rate')
+        return cls('tiktok', **values)
+
+    def to_tiktok_info(self):
+        """Return the TikTok get_user_info() dict: strings with 'No <key> found' placeholders"""
+        info = {}
+        for key, name, kind in TIKTOK_INFO_FIELDS:
+            info[key] = _format_value(getattr(self, name), f"No {key} found")
+        info['social_links'] = list(self.social_links or ())
+        info['engagement_rate'] = self.engagement_rate or 0
+        info['advanced_engagement_rate'] = self.advanced_engagement_rate or 0
+        return info
+
+    # ---- Instagram profile dict ----
+
+    @classmethod
+    def from_instagram_profile(cls, profile_data):
+        """Build a record from an InstagramScraper.scrape_profile() dict"""
+        values = {}
+        for key, name, kind, default in INSTAGRAM_PROFILE_FIELDS:
+            # platform, instagram_url and engagement_rate are not plain stored fields
+            if name is None or name in ('platform', 'engagement_rate'):
+                continue
+            values[name] = coerce_value(profile_data.get(key), kind)
+        values['engagement_rate'] = profile_data.get('engagement_rate') or None
+        return cls('instagram', **values)
+
+    def to_instagram_profile(self):
+        """Return the InstagramScraper.scrape_profile() dict with its string defaults"""
+        profile_data = {}
+        for key, name, kind, default in INSTAGRAM_PROFILE_FIELDS:
+            if key == 'engagement_rate':
+                profile_data[key] = self.engagement_rate or 0
+            elif key == 'platform':
+                profile_data[key] = 'instagram'
+            elif key == 'instagram_url':
+                profile_data[key] = f"https://www.instagram.com/{self.username}/"
+            else:
+                profile_data[key] = _format_value(getattr(self, name), default)
+        return profile_data
+
+# TikTok info key -> record attribute -> native type, in get_user_info() key order
+TIKTOK_INFO_FIELDS = [
+    ('user_id', 'user_id', str),
+    ('unique_id', 'username', str),
+    ('nickname', 'full_name', str),
+    ('followers', 'followers', int),
+    ('following', 'following', int),
+    ('likes', 'likes', int),
+    ('videos', 'posts', int),
+    ('signature', 'biography', str),
+    ('verified', 'is_verified', bool),
+    ('secUid', 'sec_uid', str),
+    ('commentSetting', 'comment_setting', int),
+    ('privateAccount', 'is_private', bool),
+    ('region', 'region', str),
+    ('heart', 'heart', int),
+    ('diggCount', 'digg_count', int),
+    ('friendCount', 'friend_count', int),
+    ('profile_pic', 'profile_pic_url', str)
+]
+
+# Instagram profile key -> record attribute -> native type -> string default, in scrape_profile() key order
+INSTAGRAM_PROFILE_FIELDS = [
+    ('average_comments', 'average_comments', int, "Not Available"),
+    ('average_likes', 'average_likes', int, "Not Available"),
+    ('biography', 'biography', str, "Not Available"),
+    ('category', 'category', str, "Not Available"),
+    ('country', 'region', str, "ID"),  # Default to Indonesia as per example
+    ('engagement_rate', 'engagement_rate', None, 0),
+    ('followers', 'followers', int, "0"),
+    ('following', 'following', int, "0"),
+    ('full_name', 'full_name', str, "Not Available"),
+    ('is_professional_account', 'is_professional', bool, "Not Available"),
+    ('is_verified', 'is_verified', bool, "false"),
+    ('platform', 'platform', str, "instagram"),
+    ('posts', 'posts', int, "0"),
+    ('profile_pic_url_hd', 'profile_pic_url', str, ""),
+    ('instagram_url', None, str, ""),
+    ('username', 'username', str, "")
+]
+
+def _is_placeholder(value):
+    """True for the 'Not Available' / 'No <key> found' markers of the legacy dicts"""
+    return value == "Not Available" or (isinstance(value, str) and value.startswith("No ") and value.endswith(" found"))
+
+def coerce_value(value, kind):
+    """Convert a string-valued dict entry back to its native type (None for placeholders)"""
+    if value is None or _is_placeholder(value):
+        return None
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        return {'true': True, 'false': False}.get(str(value).lower())
+    if kind is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+def _format_value(value, placeholder):
+    """Convert a native value to the string form used in the legacy dicts"""
+    if value is None:
+        return placeholder
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
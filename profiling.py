@@ -0,0 +1,136 @@
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+import metrics
+
+def add_profile_arguments(parser):
+    """Add the --profile options shared by the scraper CLIs"""
+    parser.add_argument("--profile", action="store_true", help="Print a per-phase wall/CPU time breakdown to stderr")
+    parser.add_argument("--profile-output", type=str, metavar="FILE", help="With --profile, also write a cProfile pstats dump to FILE")
+    parser.add_argument("--profile-memory", type=int, default=0, metavar="N", help="With --profile, also report the top N allocation sites (tracemalloc)")
+
+def session_from_args(args):
+    """Return a ProfileSession for the parsed CLI options, or None when --profile is off"""
+    if not args.profile:
+        return None
+    return ProfileSession(pstats_path=args.profile_output, memory_top=args.profile_memory)
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+class ProfileSession:
+    """Collects per-phase timings for a CLI run, optionally with cProfile and tracemalloc.
+
+    Phases are the metrics.stage() blocks (fetch, parse, links, avatar), so the
+    breakdown matches what api.py exports. Timings from every thread are
+    aggregated, which makes batch runs report per-phase totals and percentiles.
+    """
+
+    def __init__(self, pstats_path=None, memory_top=0):
+        self.pstats_path = pstats_path
+        self.memory_top = memory_top
+        self.phases = {}  # (platform, stage) -> ([wall seconds], cpu total)
+        self.lookups = 0
+        self._lock = threading.Lock()
+        self._profiler = cProfile.Profile() if pstats_path else None
+        self._thread_profilers = []
+        self._local = threading.local()
+
+    def __enter__(self):
+        metrics.stage_hooks.append(self.record)
+        if self.memory_top:
+            tracemalloc.start()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.process_time() - self._cpu_start
+        metrics.stage_hooks.remove(self.record)
+        if self.memory_top:
+            # Snapshot before building the reports so their own allocations are left out
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            self._memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.report()
+
+    def record(self, platform, stage, wall, cpu):
+        with self._lock:
+            samples = self.phases.get((platform, stage))
+            if samples is None:
+                samples = self.phases[(platform, stage)] = ([], [0.0])
+            samples[0].append(wall)
+            samples[1][0] += cpu
+
+    def wrap(self, fn):
+        """Wrap a per-lookup function so it is counted and, with cProfile on, profiled in worker threads"""
+        def profiled(*args, **kwargs):
+            with self._lock:
+                self.lookups += 1
+            profiler = self._thread_profiler()
+            if profiler is None:
+                return fn(*args, **kwargs)
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+        return profiled
+
+    def _thread_profiler(self):
+        """Return this worker thread's profiler, or None if the main profiler already covers it"""
+        if self._profiler is None or threading.current_thread() is threading.main_thread():
+            return None
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            profiler = self._local.profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                profiler.disable()
+            except ValueError:
+                # Newer Pythons allow a single active profiler, which already sees every thread
+                profiler = self._local.profiler = False
+            else:
+                with self._lock:
+                    self._thread_profilers.append(profiler)
+        return profiler or None
+
+    def report(self, out=None):
+        out = out or sys.stderr
+        lookups = f"{self.lookups} lookup{'s' if self.lookups != 1 else ''}, " if self.lookups else ""
+        print(f"\n=== Profile: {lookups}wall {self.wall:.3f}s, CPU {self.cpu:.3f}s ===", file=out)
+        print(f"{'phase':20s} {'calls':>7s} {'wall total':>11s} {'mean ms':>9s} {'p95 ms':>9s} {'cpu total':>10s} {'% wall':>7s}", file=out)
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -sum(item[1][0]))
+        for (platform, stage), (walls, cpu) in phases:
+            total = sum(walls)
+            ordered = sorted(walls)
+            share = total / self.wall * 100 if self.wall else 0.0
+            print(f"{platform + '/' + stage:20s} {len(walls):7d} {total:10.3f}s {total / len(walls) * 1e3:9.2f} "
+                  f"{_percentile(ordered, 0.95) * 1e3:9.2f} {cpu[0]:9.3f}s {share:6.1f}%", file=out)
+        if self.lookups > 1:
+            print("(phases of concurrent lookups overlap, so their totals can exceed the run's wall time)", file=out)
+
+        if self._profiler is not None:
+            stats = pstats.Stats(self._profiler, *self._thread_profilers)
+            stats.dump_stats(self.pstats_path)
+            summary = io.StringIO()
+            stats.stream = summary
+            stats.sort_stats('cumulative').print_stats(15)
+            print(f"\ncProfile dump written to {self.pstats_path} (top functions by cumulative time):", file=out)
+            print(summary.getvalue().strip(), file=out)
+
+        if self.memory_top:
+            print(f"\nTop {self.memory_top} allocation sites (peak traced {self._memory_peak / 1024:.1f} KB):", file=out)
+            for stat in self._memory_snapshot.statistics('lineno')[:self.memory_top]:
+                print(f"  {stat}", file=out)
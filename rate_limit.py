@@ -0,0 +1,131 @@
+import time
+import threading
+
+# Default (rate per second, burst) for hosts without an explicit configure() call
+DEFAULT_LIMIT = (2.0, 5)
+
+# Per-host defaults, chosen to stay close to the old fixed-sleep pacing on average
+HOST_LIMITS = {
+    'i.instagram.com': (0.5, 3),
+    'www.instagram.com': (0.33, 2)
+}
+
+class TokenBucket:
+    """Thread-safe token bucket with multiplicative slow-down on throttling"""
+
+    def __init__(self, rate, burst, min_rate=None, recovery=0.05):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        # Never slow down below this rate, however many 429s we see
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        # Fraction of base_rate recovered after each successful request
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Caller holds the lock
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how many seconds the caller must wait before using it"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            # Tokens may go negative: later callers queue up behind earlier reservations
+            return -self.tokens / self.rate
+
+    def delay(self):
+        """Return how long a reservation made now would wait, without taking a token"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        """Gradually restore the configured rate after a successful request"""
+        with self._lock:
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * self.recovery)
+
+    def on_throttled(self, retry_after=None):
+        """Halve the rate after a 429 and, if given, pause for Retry-After seconds"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.tokens = min(self.tokens, -retry_after * self.rate)
+
+    def stats(self):
+        """Return the current rate, available tokens and throttle count"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': round(self.rate, 4),
+                'base_rate': self.base_rate,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'throttled': self.throttled
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def configure(host, rate, burst):
+    """Set the rate (requests per second) and burst for a host"""
+    with _limiters_lock:
+        HOST_LIMITS[host] = (rate, burst)
+        _limiters[host] = TokenBucket(rate, burst)
+
+def scale(factor):
+    """Multiply every host's rate and burst by factor, e.g. 1/N when N processes share one IP"""
+    global DEFAULT_LIMIT
+    with _limiters_lock:
+        DEFAULT_LIMIT = (DEFAULT_LIMIT[0] * factor, max(1, round(DEFAULT_LIMIT[1] * factor)))
+        for host, (rate, burst) in list(HOST_LIMITS.items()):
+            HOST_LIMITS[host] = (rate * factor, max(1, round(burst * factor)))
+        # Existing buckets are rebuilt from the new limits on next use
+        _limiters.clear()
+
+def get_limiter(host, endpoint=None):
+    """Return the shared limiter for a host, creating it from the defaults on first use.
+
+    Each egress endpoint gets its own bucket with the host's limits, since hosts throttle per client IP.
+    """
+    key = host if endpoint is None else f"{host} via {endpoint}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rate, burst = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+            limiter = _limiters[key] = TokenBucket(rate, burst)
+        return limiter
+
+def endpoint_delays(host):
+    """Return a function giving the current limiter wait for a host through an egress endpoint"""
+    return lambda endpoint: get_limiter(host, endpoint.name).delay()
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given in seconds; HTTP-dates are ignored"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def stats():
+    """Return limiter stats for every host seen so far"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.stats() for host, limiter in limiters.items()}
@@ -0,0 +1,273 @@
+import os
+import time
+import random
+import threading
+import urllib.parse
+
+import egress
+import metrics
+import rate_limit
+
+# Upstream responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+class UpstreamError(Exception):
+    """An upstream lookup failed; `reason` and `status` classify it for callers and the API"""
+
+    reason = 'upstream_error'
+    status = 502
+
+    def __init__(self, message, host=None, retry_after=None):
+        super().__init__(message)
+        self.host = host
+        self.retry_after = retry_after
+
+class RateLimited(UpstreamError):
+    """The host kept answering 429 (or 5xx) after every retry"""
+
+    reason = 'rate_limited'
+    status = 503
+
+class CircuitOpen(RateLimited):
+    """The host's circuit breaker is open, so the request was not sent"""
+
+    reason = 'circuit_open'
+
+class NotFound(UpstreamError):
+    """The account does not exist"""
+
+    reason = 'not_found'
+    status = 404
+
+class PrivateAccount(UpstreamError):
+    """The account is private and its counts are not visible"""
+
+    reason = 'private'
+    status = 403
+
+class ParseFailure(UpstreamError):
+    """The host answered, but the response held no usable profile data"""
+
+    reason = 'parse_failure'
+    status = 502
+
+def raise_for_status(status, headers, url):
+    """Raise the classified UpstreamError for a non-2xx upstream status"""
+    if status < 400:
+        return
+    host = urllib.parse.urlsplit(url).hostname or ''
+    if status in (404, 410):
+        raise NotFound(f"{host} returned {status}: account not found", host)
+    if status in RETRY_STATUSES:
+        retry_after = rate_limit.parse_retry_after(headers.get('Retry-After'))
+        raise RateLimited(f"{host} returned {status} after retries", host, retry_after)
+    raise UpstreamError(f"{host} returned {status}", host)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors Retry-After"""
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        # Longest single wait; a Retry-After beyond it fails the request instead of stalling a worker
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` + 1, or None to give up"""
+        if attempt + 1 >= self.attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            # Spread the clients that were all told the same Retry-After
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class CircuitBreaker:
+    """Per-host breaker: after `failure_threshold` consecutive failures, reject requests for a while.
+
+    Once `reset_timeout` (or the host's Retry-After, if longer) has passed, one
+    probe request is let through; its success closes the breaker and its
+    failure opens it again. A probe that never reports back (cancelled, or
+    failed for a reason unrelated to the host) is replaced after another
+    reset_timeout.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.rejected = 0
+        self.opened = 0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpen unless a request to the host may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self.opened_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and (self._probe_started is None or
+                                                 now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return
+            self.rejected += 1
+            retry_after = max(0.0, self.opened_until - now)
+        raise CircuitOpen(f"{self.host} is failing; requests are paused for {retry_after:.1f}s", self.host, retry_after)
+
+    def on_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def on_failure(self, retry_after=None):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self.opened_until = time.monotonic() + max(self.reset_timeout, retry_after or 0.0)
+                self._probe_started = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'retry_in': round(max(0.0, self.opened_until - time.monotonic()), 1) if self.state == self.OPEN else 0.0
+            }
+
+class RequestAttempts:
+    """Retry bookkeeping for one upstream GET, shared by the sync and async clients.
+
+    The caller loops: begin() checks the host's breaker, picks the egress
+    endpoint and returns how long to wait for a rate-limit token; after sending,
+    on_response() or on_error() update the breaker, endpoint health and limiter
+    and return the delay before the next attempt, or None when the caller should
+    return the response or re-raise the error.
+    """
+
+    def __init__(self, url, rate_limited=False, policy=None):
+        self.host = urllib.parse.urlsplit(url).hostname or ''
+        self.rate_limited = rate_limited
+        self.policy = policy or retry_policy
+        self.breaker = get_breaker(self.host)
+        self.pool = egress.get_pool()
+        self.attempt = 0
+        self.endpoint = None
+        self.limiter = None
+        self._sent_at = 0.0
+
+    def begin(self):
+        """Start an attempt; raises CircuitOpen while the host is failing"""
+        self.breaker.before_request()
+        self.endpoint = None
+        if self.pool is not None:
+            # Steer away from endpoints whose bucket for this host is drained
+            self.endpoint = self.pool.choose(rate_limit.endpoint_delays(self.host) if self.rate_limited else None)
+        self.limiter = None
+        wait = 0.0
+        if self.rate_limited:
+            self.limiter = rate_limit.get_limiter(self.host, self.endpoint and self.endpoint.name)
+            wait = self.limiter.reserve()
+        # Endpoint latency is measured from when the request can go out
+        self._sent_at = time.perf_counter() + max(wait, 0.0)
+        return wait
+
+    def on_response(self, status, headers):
+        """Return the delay before retrying a throttled or 5xx response, or None to return it"""
+        if self.endpoint is not None:
+            self.pool.record(self.endpoint, status not in egress.UNHEALTHY_STATUSES, time.perf_counter() - self._sent_at)
+        if status not in RETRY_STATUSES:
+            self.breaker.on_success()
+            if self.limiter is not None:
+                self.limiter.on_success()
+            return None
+        retry_after = rate_limit.parse_retry_after(headers.get('Retry-After'))
+        self.breaker.on_failure(retry_after)
+        if self.limiter is not None and status == 429:
+            # Slow down every caller using this route to the host, honoring Retry-After if present
+            self.limiter.on_throttled(retry_after)
+        return self._next(self.policy.delay(self.attempt, retry_after), str(status))
+
+    def on_error(self, proxy_error=False):
+        """Return the delay before retrying after a connection failure or timeout, or None to re-raise it"""
+        if self.endpoint is not None:
+            self.pool.record(self.endpoint, False, time.perf_counter() - self._sent_at)
+        # A dead proxy says nothing about the upstream host
+        if not proxy_error:
+            self.breaker.on_failure()
+        return self._next(self.policy.delay(self.attempt), 'connection')
+
+    def _next(self, delay, reason):
+        if delay is not None:
+            metrics.UPSTREAM_RETRIES.inc(host=self.host, reason=reason)
+            self.attempt += 1
+        return delay
+
+# Defaults, overridable through the environment or configure()
+retry_policy = RetryPolicy(
+    attempts=int(os.environ.get('SCRAPER_RETRY_ATTEMPTS', 3)),
+    base_delay=float(os.environ.get('SCRAPER_RETRY_BASE_DELAY', 0.5)),
+    max_delay=float(os.environ.get('SCRAPER_RETRY_MAX_DELAY', 30))
+)
+BREAKER_THRESHOLD = int(os.environ.get('SCRAPER_BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.environ.get('SCRAPER_BREAKER_RESET', 30))
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def configure(attempts=None, base_delay=None, max_delay=None, breaker_threshold=None, breaker_reset=None):
+    """Change the retry policy and/or breaker settings; existing breakers are replaced"""
+    global BREAKER_THRESHOLD, BREAKER_RESET
+    if attempts is not None:
+        retry_policy.attempts = attempts
+    if base_delay is not None:
+        retry_policy.base_delay = base_delay
+    if max_delay is not None:
+        retry_policy.max_delay = max_delay
+    with _breakers_lock:
+        if breaker_threshold is not None:
+            BREAKER_THRESHOLD = breaker_threshold
+        if breaker_reset is not None:
+            BREAKER_RESET = breaker_reset
+        _breakers.clear()
+
+def get_breaker(host):
+    """Return the shared circuit breaker for a host, creating it on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host, BREAKER_THRESHOLD, BREAKER_RESET)
+        return breaker
+
+def stats():
+    """Return breaker stats for every host seen so far"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {host: breaker.stats() for host, breaker in breakers.items()}
+
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+def collect_metrics():
+    breakers = stats()
+    return [
+        ('upstream_circuit_state', 'gauge', 'Circuit breaker state per host (0 closed, 1 half-open, 2 open)',
+         [({'host': host}, _STATE_VALUES[state['state']]) for host, state in breakers.items()]),
+        ('upstream_circuit_rejections_total', 'counter', 'Requests failed fast by an open circuit breaker',
+         [({'host': host}, state['rejected']) for host, state in breakers.items()])
+    ]
+
+metrics.REGISTRY.add_collector(collect_metrics)
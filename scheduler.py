@@ -0,0 +1,321 @@
+import sys
+import time
+import heapq
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import resilience
+from rate_limit import TokenBucket
+
+# Counts compared between polls to decide whether an account changed
+TRACKED_FIELDS = ('followers', 'following', 'likes', 'posts')
+
+def tiktok_fetcher(account):
+    import TikTok
+    return TikTok.fetch_user_record(account.identifier, account.by_id)
+
+def instagram_fetcher(account):
+    import Instagram
+    return Instagram.fetch_record(account.identifier)
+
+FETCHERS = {
+    'tiktok': tiktok_fetcher,
+    'instagram': instagram_fetcher
+}
+
+class WatchedAccount:
+    """Polling state of one watchlist entry"""
+
+    __slots__ = ('platform', 'identifier', 'by_id', 'interval', 'due', 'last_polled',
+                 'change_rate', 'polls', 'changes', 'failures', 'last_values')
+
+    def __init__(self, platform, identifier, by_id=False, interval=3600.0, due=0.0):
+        self.platform = platform
+        self.identifier = identifier
+        self.by_id = by_id
+        self.interval = interval
+        self.due = due
+        self.last_polled = None
+        # Exponentially weighted share of recent polls that saw a change
+        self.change_rate = 0.5
+        self.polls = 0
+        self.changes = 0
+        self.failures = 0
+        self.last_values = None
+
+    def __repr__(self):
+        return f"WatchedAccount({self.platform!r}, {self.identifier!r}, interval={self.interval:.0f})"
+
+class RefreshScheduler:
+    """Adaptive poller for large watchlists.
+
+    Accounts sit in one heap per platform ordered by when they become stale.
+    After each poll an account's interval is halved if its counts changed and
+    grown by `backoff` if they did not, within [min_interval, max_interval], so
+    fast-moving accounts are polled often and dormant ones rarely. Dispatch is
+    capped by a global worker count, a per-platform concurrency limit, a
+    per-platform token bucket and an optional global one (polls per second).
+    """
+
+    def __init__(self, workers=8, concurrency=None, rates=None, min_interval=900.0, max_interval=86400.0,
+                 initial_interval=3600.0, backoff=1.5, snapshots=None, on_result=None, fetchers=None, rate=None):
+        self.workers = workers
+        self.concurrency = dict(concurrency or {})
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.backoff = backoff
+        self.snapshots = snapshots
+        self.on_result = on_result
+        self.fetchers = dict(FETCHERS, **(fetchers or {}))
+        self.limiters = {platform: TokenBucket(rate, max(1, int(rate))) for platform, rate in (rates or {}).items()}
+        self.limiter = TokenBucket(rate, max(1, int(rate))) if rate else None
+        self._queues = {}
+        self._inflight = {}
+        self._total_inflight = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.polled = 0
+        self.changed = 0
+        self.failed = 0
+
+    def add(self, platform, identifier, by_id=False):
+        """Add an account to the watchlist; it is due immediately unless seeded from snapshots"""
+        if platform not in self.fetchers:
+            raise ValueError(f"Unsupported platform: {platform}")
+        account = WatchedAccount(platform, identifier, by_id, self.initial_interval)
+        if self.snapshots is not None:
+            self._seed(account)
+        with self._cond:
+            self._push(account)
+            self._cond.notify()
+        return account
+
+    def _seed(self, account):
+        """Resume an account's schedule from its stored polls so restarts don't re-poll everything"""
+        polls = self.snapshots.polls(account.platform, account.identifier)[-10:]
+        if not polls:
+            return
+        # The first stored poll records every field, so it says nothing about change
+        recent = polls[1:] or polls
+        account.change_rate = sum(1 for _, changed in recent if changed) / len(recent)
+        account.interval = self._interval_for(account.change_rate)
+        account.last_polled = polls[-1][0]
+        account.due = account.last_polled + account.interval
+
+    def _interval_for(self, change_rate):
+        # Interpolate on a log scale: always changing -> min_interval, never -> max_interval
+        return self.min_interval * (self.max_interval / self.min_interval) ** (1.0 - change_rate)
+
+    def _push(self, account):
+        # Caller holds the condition
+        heapq.heappush(self._queues.setdefault(account.platform, []), (account.due, next(self._seq), account))
+
+    def _next_ready(self, now):
+        """Pop the stalest due account whose platform has spare capacity; else return the next wake-up time"""
+        # Caller holds the condition
+        best = None
+        for platform, queue in self._queues.items():
+            if not queue:
+                continue
+            if self._inflight.get(platform, 0) >= self.concurrency.get(platform, self.workers):
+                continue
+            if best is None or queue[0][0] < self._queues[best][0][0]:
+                best = platform
+        if best is None:
+            return None, None
+        due = self._queues[best][0][0]
+        if due > now:
+            return None, due
+        return heapq.heappop(self._queues[best])[2], None
+
+    def run(self, duration=None, max_polls=None):
+        """Poll until stopped, for `duration` seconds, or until `max_polls` polls were dispatched"""
+        deadline = time.monotonic() + duration if duration else None
+        dispatched = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='refresh') as executor:
+            with self._cond:
+                while not self._stopped:
+                    if deadline and time.monotonic() >= deadline:
+                        break
+                    if max_polls is not None and dispatched >= max_polls:
+                        break
+                    if self._total_inflight >= self.workers:
+                        self._cond.wait()
+                        continue
+                    account, wake_at = self._next_ready(time.time())
+                    if account is None:
+                        timeout = None if wake_at is None else max(0.0, wake_at - time.time())
+                        if deadline:
+                            timeout = min(timeout if timeout is not None else float('inf'), deadline - time.monotonic())
+                        self._cond.wait(timeout)
+                        continue
+                    self._inflight[account.platform] = self._inflight.get(account.platform, 0) + 1
+                    self._total_inflight += 1
+                    dispatched += 1
+                    executor.submit(self._poll, account)
+        if self.snapshots is not None:
+            self.snapshots.flush()
+        return dispatched
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _poll(self, account):
+        limiter = self.limiters.get(account.platform)
+        if limiter is not None:
+            limiter.acquire()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        record = error = None
+        retry_after = 0.0
+        try:
+            record = self.fetchers[account.platform](account)
+            if record is None:
+                error = "User not found or unable to fetch profile"
+        except resilience.UpstreamError as e:
+            error = str(e)
+            # A throttled or failing host says when to come back; don't poll it sooner
+            retry_after = e.retry_after or 0.0
+        except Exception as e:
+            error = str(e)
+
+        now = time.time()
+        changed = False
+        # Rescheduled even if the bookkeeping below fails
+        account.due = now + account.interval
+        try:
+            if error is None:
+                values = tuple(getattr(record, field) for field in TRACKED_FIELDS)
+                changed = account.last_values is not None and values != account.last_values
+                if account.last_values is not None:
+                    account.change_rate = 0.7 * account.change_rate + 0.3 * (1.0 if changed else 0.0)
+                    if changed:
+                        account.interval = max(self.min_interval, account.interval / 2)
+                    else:
+                        account.interval = min(self.max_interval, account.interval * self.backoff)
+                account.last_values = values
+                account.changes += changed
+                if self.snapshots is not None:
+                    try:
+                        self.snapshots.add(record, now)
+                    except Exception as e:
+                        print(f"Error storing snapshot of {account.platform}/{account.identifier}: {e}", file=sys.stderr)
+            else:
+                account.failures += 1
+                print(f"Error polling {account.platform}/{account.identifier}: {error}", file=sys.stderr)
+            account.polls += 1
+            account.last_polled = now
+            account.due = now + max(account.interval, retry_after)
+
+            if self.on_result is not None:
+                try:
+                    self.on_result(account, record, changed, error)
+                except Exception as e:
+                    print(f"Error in result callback for {account.identifier}: {e}", file=sys.stderr)
+        except Exception as e:
+            print(f"Error recording poll of {account.platform}/{account.identifier}: {e}", file=sys.stderr)
+        finally:
+            # Always free the slot and reschedule the account, or the scheduler slowly stalls
+            with self._cond:
+                self.polled += 1
+                self.changed += changed
+                self.failed += error is not None
+                self._inflight[account.platform] -= 1
+                self._total_inflight -= 1
+                self._push(account)
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return poll counters, in-flight work and queue depth per platform"""
+        with self._cond:
+            now = time.time()
+            return {
+                'polled': self.polled,
+                'changed': self.changed,
+                'failed': self.failed,
+                'inflight': dict(self._inflight),
+                'queued': {platform: len(queue) for platform, queue in self._queues.items()},
+                'due': {platform: sum(1 for due, _, _ in queue if due <= now) for platform, queue in self._queues.items()},
+                'limiters': {platform: limiter.stats() for platform, limiter in self.limiters.items()},
+                'limiter': self.limiter.stats() if self.limiter is not None else None
+            }
+
+def read_watchlist(path, default_platform='tiktok'):
+    """Yield (platform, identifier, by_id) from lines of '[platform] identifier'; 'id:<number>' marks TikTok user IDs"""
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            platform, identifier = (parts[0], parts[1]) if len(parts) > 1 else (default_platform, parts[0])
+            by_id = identifier.startswith('id:')
+            yield platform, identifier[3:] if by_id else identifier, by_id
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll a watchlist of TikTok/Instagram accounts, adapting to how often each changes")
+    parser.add_argument("watchlist", help="File with one '[platform] identifier' per line, or '-' for stdin")
+    parser.add_argument("--platform", choices=sorted(FETCHERS), default="tiktok", help="Platform for lines without one (default: tiktok)")
+    parser.add_argument("--snapshots", metavar="DB", help="Record results in the SQLite snapshot store DB and resume schedules from it")
+    parser.add_argument("--egress", metavar="FILE", help="Spread requests over the proxies and header profiles in this JSON file")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum concurrent polls overall (default: 8)")
+    parser.add_argument("--tiktok-concurrency", type=int, default=8, help="Maximum concurrent TikTok polls (default: 8)")
+    parser.add_argument("--instagram-concurrency", type=int, default=2, help="Maximum concurrent Instagram polls (default: 2)")
+    parser.add_argument("--rate", type=float, help="Polls per second across all platforms (default: only the per-platform rates)")
+    parser.add_argument("--tiktok-rate", type=float, default=2.0, help="TikTok polls per second (default: 2)")
+    parser.add_argument("--instagram-rate", type=float, default=0.3, help="Instagram polls per second (default: 0.3)")
+    parser.add_argument("--min-interval", type=float, default=900, help="Shortest re-poll interval in seconds (default: 900)")
+    parser.add_argument("--max-interval", type=float, default=86400, help="Longest re-poll interval in seconds (default: 86400)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds (default: run until interrupted)")
+    args = parser.parse_args()
+
+    if args.egress:
+        import egress
+        egress.load_config(args.egress)
+    snapshots = None
+    if args.snapshots:
+        from snapshot_store import SnapshotStore
+        snapshots = SnapshotStore(args.snapshots)
+
+    def report(account, record, changed, error):
+        if error is None:
+            state = "changed" if changed else "unchanged"
+            print(f"{account.platform}/{account.identifier}: {state}, followers={record.followers}, "
+                  f"next poll in {account.interval:.0f}s", flush=True)
+
+    scheduler = RefreshScheduler(
+        workers=args.workers,
+        concurrency={'tiktok': args.tiktok_concurrency, 'instagram': args.instagram_concurrency},
+        rates={'tiktok': args.tiktok_rate, 'instagram': args.instagram_rate},
+        rate=args.rate,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        initial_interval=min(max(3600.0, args.min_interval), args.max_interval),
+        snapshots=snapshots,
+        on_result=report
+    )
+    for platform, identifier, by_id in read_watchlist(args.watchlist, args.platform):
+        scheduler.add(platform, identifier, by_id)
+
+    try:
+        scheduler.run(duration=args.duration)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    finally:
+        if snapshots is not None:
+            snapshots.close()
+    stats = scheduler.stats()
+    print(f"Scheduler stopped: {stats['polled']} polls, {stats['changed']} changed, {stats['failed']} failed", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
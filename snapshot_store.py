@@ -0,0 +1,308 @@
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+from profile_record import ProfileRecord
+
+# Fields compared between polls; platform is part of the account identity
+SNAPSHOT_FIELDS = ProfileRecord.__slots__[1:]
+BOOL_FIELDS = {'is_verified', 'is_private', 'is_professional'}
+# Fields growth() and top_growth() can subtract
+NUMERIC_FIELDS = ('followers', 'following', 'posts', 'likes', 'heart', 'digg_count', 'friend_count',
+                  'average_likes', 'average_comments', 'engagement_rate', 'advanced_engagement_rate')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    account_key TEXT NOT NULL,
+    user_id TEXT,
+    sec_uid TEXT,
+    username TEXT,
+    state TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    UNIQUE (platform, account_key)
+);
+CREATE INDEX IF NOT EXISTS accounts_user_id ON accounts (platform, user_id);
+CREATE INDEX IF NOT EXISTS accounts_sec_uid ON accounts (platform, sec_uid);
+CREATE INDEX IF NOT EXISTS accounts_username ON accounts (platform, username);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    account_id INTEGER NOT NULL REFERENCES accounts (id),
+    taken_at REAL NOT NULL,
+    changed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_account_time ON snapshots (account_id, taken_at);
+CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (taken_at);
+
+CREATE TABLE IF NOT EXISTS changes (
+    account_id INTEGER NOT NULL REFERENCES accounts (id),
+    field TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS changes_account_field_time ON changes (account_id, field, taken_at);
+"""
+
+# Value of a field at a point in time: the last change at or before it, else the first one recorded
+VALUE_AT = """
+COALESCE(
+    (SELECT value FROM changes WHERE account_id = a.id AND field = :field AND taken_at <= {at}
+     ORDER BY taken_at DESC LIMIT 1),
+    (SELECT value FROM changes WHERE account_id = a.id AND field = :field
+     ORDER BY taken_at LIMIT 1)
+)
+"""
+
+def _account_key(record):
+    """Stable identity of an account: the numeric user id when known, else the username"""
+    return str(record.user_id or record.username or '')
+
+def _to_column(value):
+    if isinstance(value, (tuple, list)):
+        return json.dumps(list(value), ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def _from_column(field, value):
+    if value is None:
+        return None
+    if field == 'social_links':
+        return tuple(json.loads(value))
+    if field in BOOL_FIELDS:
+        return bool(value)
+    return value
+
+class SnapshotStore:
+    """SQLite history of scraped profiles that stores only the fields that changed.
+
+    Every poll adds a row to snapshots; changes holds one row per field whose
+    value differs from the account's previous poll, so growth at any point in
+    time is an indexed lookup. add() buffers records and writes them in one
+    transaction per batch_size records (or on flush()).
+    """
+
+    def __init__(self, path='snapshots.db', batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, record, taken_at=None):
+        """Queue a ProfileRecord snapshot; written once batch_size snapshots are pending"""
+        with self._lock:
+            self._pending.append((record, taken_at or time.time()))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def add_many(self, records, taken_at=None):
+        """Store many records and flush them"""
+        for record in records:
+            self.add(record, taken_at)
+        self.flush()
+
+    def flush(self):
+        """Write every pending snapshot in a single transaction; returns the number of changed fields"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            snapshots = []
+            changes = []
+            with self._conn:
+                for record, taken_at in pending:
+                    key = _account_key(record)
+                    if not key:
+                        continue
+                    account_id, previous = self._upsert_account(record, key, taken_at)
+                    changed = 0
+                    for field in SNAPSHOT_FIELDS:
+                        value = _to_column(getattr(record, field))
+                        if value is None or previous.get(field) == value:
+                            # Missing values keep the last known one instead of erasing it
+                            continue
+                        previous[field] = value
+                        changes.append((account_id, field, taken_at, value))
+                        changed += 1
+                    snapshots.append((account_id, taken_at, changed))
+                    self._conn.execute('UPDATE accounts SET state = ? WHERE id = ?',
+                                       (json.dumps(previous, ensure_ascii=False), account_id))
+                self._conn.executemany('INSERT INTO snapshots (account_id, taken_at, changed) VALUES (?, ?, ?)', snapshots)
+                self._conn.executemany('INSERT INTO changes (account_id, field, taken_at, value) VALUES (?, ?, ?, ?)', changes)
+            return len(changes)
+
+    def _upsert_account(self, record, key, taken_at):
+        row = self._conn.execute('SELECT id, state FROM accounts WHERE platform = ? AND account_key = ?',
+                                 (record.platform, key)).fetchone()
+        if row is None:
+            cursor = self._conn.execute(
+                'INSERT INTO accounts (platform, account_key, user_id, sec_uid, username, state, first_seen, last_seen) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (record.platform, key, record.user_id, record.sec_uid, record.username, '{}', taken_at, taken_at))
+            return cursor.lastrowid, {}
+        self._conn.execute(
+            'UPDATE accounts SET sec_uid = COALESCE(?, sec_uid), username = COALESCE(?, username), '
+            'last_seen = MAX(last_seen, ?) WHERE id = ?',
+            (record.sec_uid, record.username, taken_at, row[0]))
+        return row[0], json.loads(row[1])
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    # ---- Queries ----
+
+    def find_account(self, platform, identifier):
+        """Return the account id for a user id, secUid or username, or None"""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id FROM accounts WHERE platform = :platform AND '
+                '(user_id = :identifier OR sec_uid = :identifier OR username = :identifier OR account_key = :identifier) '
+                'ORDER BY last_seen DESC LIMIT 1',
+                {'platform': platform, 'identifier': identifier}).fetchone()
+        return row[0] if row else None
+
+    def latest(self, platform, identifier):
+        """Return the most recent known ProfileRecord of an account, or None"""
+        account_id = self.find_account(platform, identifier)
+        if account_id is None:
+            return None
+        with self._lock:
+            state = json.loads(self._conn.execute('SELECT state FROM accounts WHERE id = ?', (account_id,)).fetchone()[0])
+        return ProfileRecord(platform, **{field: _from_column(field, value) for field, value in state.items()})
+
+    def history(self, platform, identifier, field='followers', since=None, until=None):
+        """Return [(taken_at, value)] for every change of a field"""
+        account_id = self.find_account(platform, identifier)
+        if account_id is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT taken_at, value FROM changes WHERE account_id = ? AND field = ? AND taken_at >= ? AND taken_at <= ? '
+                'ORDER BY taken_at',
+                (account_id, field, since or 0, until or float('inf'))).fetchall()
+        return [(taken_at, _from_column(field, value)) for taken_at, value in rows]
+
+    def polls(self, platform, identifier, since=None):
+        """Return [(taken_at, changed field count)] for every stored poll of an account"""
+        account_id = self.find_account(platform, identifier)
+        if account_id is None:
+            return []
+        with self._lock:
+            return self._conn.execute(
+                'SELECT taken_at, changed FROM snapshots WHERE account_id = ? AND taken_at >= ? ORDER BY taken_at',
+                (account_id, since or 0)).fetchall()
+
+    def growth(self, platform, identifier, field='followers', since=None, until=None):
+        """Return the change of a numeric field between two times, or None if it was never recorded"""
+        _check_numeric(field)
+        account_id = self.find_account(platform, identifier)
+        if account_id is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {VALUE_AT.format(at=':since')}, {VALUE_AT.format(at=':until')} FROM accounts a WHERE a.id = :id",
+                {'field': field, 'since': since or 0, 'until': until or float('inf'), 'id': account_id}).fetchone()
+        start, end = row
+        if start is None or end is None:
+            return None
+        return {'field': field, 'start': start, 'end': end, 'delta': end - start}
+
+    def top_growth(self, platform, field='followers', since=None, until=None, limit=20):
+        """Return the accounts of a platform with the largest growth of a field, largest first"""
+        _check_numeric(field)
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT username, user_id, start, "end", "end" - start AS delta FROM (
+                        SELECT a.username, a.user_id,
+                               {VALUE_AT.format(at=':since')} AS start,
+                               {VALUE_AT.format(at=':until')} AS "end"
+                        FROM accounts a WHERE a.platform = :platform)
+                    WHERE start IS NOT NULL AND "end" IS NOT NULL
+                    ORDER BY delta DESC LIMIT :limit""",
+                {'field': field, 'platform': platform, 'since': since or 0, 'until': until or float('inf'),
+                 'limit': limit}).fetchall()
+        return [{'username': username, 'user_id': user_id, 'start': start, 'end': end, 'delta': delta}
+                for username, user_id, start, end, delta in rows]
+
+    def stats(self):
+        self.flush()
+        with self._lock:
+            return {
+                'accounts': self._conn.execute('SELECT COUNT(*) FROM accounts').fetchone()[0],
+                'snapshots': self._conn.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0],
+                'changes': self._conn.execute('SELECT COUNT(*) FROM changes').fetchone()[0]
+            }
+
+def _check_numeric(field):
+    if field not in NUMERIC_FIELDS:
+        raise ValueError(f"Growth needs a numeric field ({', '.join(NUMERIC_FIELDS)}), not {field!r}")
+
+def _parse_time(value):
+    """Accept epoch seconds or an ISO date (YYYY-MM-DD[THH:MM:SS])"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pattern = '%Y-%m-%dT%H:%M:%S' if 'T' in value else '%Y-%m-%d'
+        return time.mktime(time.strptime(value, pattern))
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the profile snapshot store")
+    parser.add_argument("database", help="Snapshot database file")
+    parser.add_argument("command", choices=["stats", "latest", "history", "growth", "top"], help="Query to run")
+    parser.add_argument("--platform", choices=["tiktok", "instagram"], default="tiktok", help="Platform (default: tiktok)")
+    parser.add_argument("--account", help="User ID, secUid or username (latest, history, growth)")
+    parser.add_argument("--field", default="followers", help="Field to track (default: followers)")
+    parser.add_argument("--since", help="Start time (epoch seconds or YYYY-MM-DD)")
+    parser.add_argument("--until", help="End time (epoch seconds or YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=20, help="Number of accounts for top (default: 20)")
+    args = parser.parse_args()
+
+    if args.command in ("latest", "history", "growth") and not args.account:
+        parser.error(f"{args.command} requires --account")
+    if args.command == "history" and args.field not in SNAPSHOT_FIELDS:
+        parser.error(f"unknown field {args.field!r}; choose from {', '.join(SNAPSHOT_FIELDS)}")
+    if args.command in ("growth", "top") and args.field not in NUMERIC_FIELDS:
+        parser.error(f"{args.command} needs a numeric --field: {', '.join(NUMERIC_FIELDS)}")
+
+    since, until = _parse_time(args.since), _parse_time(args.until)
+    with SnapshotStore(args.database) as store:
+        if args.command == "stats":
+            result = store.stats()
+        elif args.command == "latest":
+            record = store.latest(args.platform, args.account)
+            result = record.to_dict() if record else None
+        elif args.command == "history":
+            result = store.history(args.platform, args.account, args.field, since, until)
+        elif args.command == "growth":
+            result = store.growth(args.platform, args.account, args.field, since, until)
+        else:
+            result = store.top_growth(args.platform, args.field, since, until, args.limit)
+
+    if result is None:
+        print("No snapshots found for this account.")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import AsyncSingleFlight
+
+class AsyncSingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waiter_gets_result_when_leader_is_cancelled(self):
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 'profile'
+
+        leader = asyncio.ensure_future(flight.do('tiktok:apple', fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('tiktok:apple', fetch))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await waiter, 'profile')
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.stats(), {'executed': 1, 'coalesced': 1, 'in_flight': 0})
+
+    async def test_exception_is_shared(self):
+        flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0)
+            raise ValueError('bad page')
+
+        results = await asyncio.gather(flight.do('k', fetch), flight.do('k', fetch), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+if __name__ == '__main__':
+    unittest.main()